@@ -1,74 +1,110 @@
 import argparse
 import csv
+import hashlib
+import html
 import json
+import asyncio
 import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 import mimetypes
 import requests
 
+from src.asset_cache import AssetCache, is_cacheable_asset
+from src.catalog import CATALOG_FILENAME, NoteCatalog
+from src.image_store import ImageStore, compact_images
+from src.journal import CrawlJournal
+from src.search import SEARCH_INDEX_FILENAME, SearchIndex, tokenize
+
 DEFAULT_MAX_SCROLLS = 200
 DEFAULT_IDLE_WAIT_MS = 1000
+# 页面就绪等待的上限，数据就绪后立即返回
+DEFAULT_READY_TIMEOUT_MS = 8000
+# 详情页复用：单个页面最多导航次数与 JS 堆内存上限（MB），超出后关闭并新建
+DEFAULT_PAGE_MAX_USES = 50
+DEFAULT_PAGE_MAX_HEAP_MB = 256
+DEFAULT_ASSET_CACHE_MB = 256
+# 每个图片主机同时进行的下载数
+DEFAULT_IMAGE_CONCURRENCY = 6
+POST_LINK_SELECTOR = 'a[href*="/explore/"], a[href*="/discovery/item/"]'
 DEFAULT_USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
 )
+# 统计/埋点、视频流与推荐流等详情页不需要的请求
+DEFAULT_BLOCK_URL_PATTERNS = [
+    r'apm-fe\.xiaohongshu\.com',
+    r'//t\d*\.xiaohongshu\.com/api/',
+    r'//(as|lng|spltest)\.xiaohongshu\.com/',
+    r'/api/sns/web/v1/homefeed',
+    r'sns-video[^/]*\.xhscdn\.com',
+    r'\.(mp4|m3u8|flv|ts)(\?|$)',
+    r'google-analytics\.com|googletagmanager\.com',
+]
+# 请求拦截预设：resource_types 按资源类型拦截，download_images 控制是否保存轮播图片
+BLOCK_PRESETS = {
+    'none': {'resource_types': [], 'deny_patterns': [], 'download_images': True},
+    'text+image-urls': {'resource_types': ['image', 'media', 'font'], 'deny_patterns': DEFAULT_BLOCK_URL_PATTERNS, 'download_images': True},
+    'text-only': {'resource_types': ['image', 'media', 'font', 'stylesheet'], 'deny_patterns': DEFAULT_BLOCK_URL_PATTERNS, 'download_images': False},
+}
 
 
-def safe_eval(page, script: str, arg=None, retries: int = 3, wait_state: str = 'domcontentloaded'):
+async def safe_eval(page, script: str, arg=None, retries: int = 3, wait_state: str = 'domcontentloaded'):
     """在页面可能发生导航或上下文重建时，安全执行 evaluate，并做重试。"""
     for attempt in range(retries):
         try:
             if arg is None:
-                return page.evaluate(script)
+                return await page.evaluate(script)
             else:
-                return page.evaluate(script, arg)
+                return await page.evaluate(script, arg)
         except Exception:
             try:
-                page.wait_for_load_state(wait_state, timeout=1000)
+                await page.wait_for_load_state(wait_state, timeout=1000)
             except Exception:
                 pass
-            page.wait_for_timeout(300)
+            await page.wait_for_timeout(300)
     return None
 
 
-def try_get_meta(page, prop: str):
+async def try_get_meta(page, prop: str):
     """优先通过 locator 获取 meta，再回退到 evaluate。"""
     try:
         loc = page.locator(f'meta[property="{prop}"]').first
-        content = loc.get_attribute('content')
+        content = await loc.get_attribute('content')
         if content:
             return content
     except Exception:
         pass
-    return safe_eval(page, """(p)=>document.querySelector(`meta[property="${p}"]`)?.content || null""", prop) or None
+    return await safe_eval(page, """(p)=>document.querySelector(`meta[property="${p}"]`)?.content || null""", prop) or None
 
 
-def try_expand_note(page):
+async def try_expand_note(page):
     """尝试点击正文区域的“展开/展开全文/更多”等按钮，以显示完整内容。"""
     candidates = ['text=展开全文', 'text=展开', 'text=更多']
     for sel in candidates:
         try:
             loc = page.locator(sel)
-            if loc.count() > 0:
-                loc.first.click()
-                page.wait_for_timeout(300)
+            if await loc.count() > 0:
+                await loc.first.click()
+                await page.wait_for_timeout(300)
                 return True
         except Exception:
             continue
     return False
 
 
-def extract_detail_desc_text(page):
+async def extract_detail_desc_text(page):
     """尽可能获取 #detail-desc .note-text 的完整文本（含隐藏/折叠换行）。"""
     # 先尝试展开
-    try_expand_note(page)
-    txt = safe_eval(
+    await try_expand_note(page)
+    txt = await safe_eval(
         page,
         """
 () => {
@@ -87,16 +123,16 @@ def extract_detail_desc_text(page):
         return txt.strip()
     # 回退：使用 innerText 并尝试滚动容器确保可见
     try:
-        page.evaluate("""
+        await page.evaluate("""
 (() => {
   const scroller = document.querySelector('#note-scroller');
   if (scroller) scroller.scrollTop = scroller.scrollHeight;
 })()
 """)
-        page.wait_for_timeout(200)
+        await page.wait_for_timeout(200)
     except Exception:
         pass
-    txt2 = safe_eval(
+    txt2 = await safe_eval(
         page,
         """
 () => {
@@ -111,6 +147,85 @@ def extract_detail_desc_text(page):
     return (txt2 or '')
 
 
+NOTE_READY_SCRIPT = """
+() => {
+  // 内嵌的初始状态已包含帖子数据时无需等待 DOM 渲染
+  const map = window.__INITIAL_STATE__?.note?.noteDetailMap;
+  if (map && Object.values(map).some(e => e?.note?.noteId && (e.note.desc || e.note.imageList?.length))) return true;
+  if (!document.querySelector('#detail-desc') && !document.querySelector('#detail-title')) return false;
+  const slides = document.querySelectorAll('.swiper-slide .img-container img');
+  if (slides.length) {
+    return Array.from(slides).some(img => /^https?:\\/\\//.test(img.getAttribute('src') || img.getAttribute('data-src') || ''));
+  }
+  // 无轮播图时：视频帖或纯文本帖，等待文档加载完成
+  return !!document.querySelector('video') || document.readyState === 'complete';
+}
+"""
+
+# 在主页安装 MutationObserver：收集新增（或 href 被替换）的帖子链接到 __xhsFeedPending，
+# harvest 为 true 时取出并清空待处理链接，每个 href 只上报一次
+FEED_OBSERVER_SCRIPT = """
+({sel, harvest}) => {
+  if (!window.__xhsFeedObserver) {
+    const seen = new Set();
+    window.__xhsFeedPending = [];
+    const take = (a) => {
+      const href = a.getAttribute('href');
+      if (href && !seen.has(href)) {
+        seen.add(href);
+        window.__xhsFeedPending.push(href);
+      }
+    };
+    document.querySelectorAll(sel).forEach(take);
+    window.__xhsFeedObserver = new MutationObserver(mutations => {
+      for (const m of mutations) {
+        if (m.type === 'attributes') {
+          if (m.target.matches(sel)) take(m.target);
+          continue;
+        }
+        for (const n of m.addedNodes) {
+          if (n.nodeType !== 1) continue;
+          if (n.matches(sel)) take(n);
+          n.querySelectorAll(sel).forEach(take);
+        }
+      }
+    });
+    window.__xhsFeedObserver.observe(document.body, {childList: true, subtree: true, attributes: true, attributeFilter: ['href']});
+  }
+  if (!harvest) return [];
+  const pending = window.__xhsFeedPending;
+  window.__xhsFeedPending = [];
+  return pending;
+}
+"""
+
+
+async def wait_for_note_ready(page, timeout_ms: int = DEFAULT_READY_TIMEOUT_MS) -> bool:
+    """等待详情页正文与轮播图片地址就绪，timeout_ms 仅作为上限。
+
+    Returns:
+        是否在超时前就绪
+    """
+    try:
+        await page.wait_for_function(NOTE_READY_SCRIPT, timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+async def wait_for_new_feed_items(page, timeout_ms: int = DEFAULT_IDLE_WAIT_MS) -> bool:
+    """等待 MutationObserver 收集到尚未取出的新帖子链接，timeout_ms 仅作为上限。
+
+    Returns:
+        是否有新链接
+    """
+    try:
+        await page.wait_for_function("() => (window.__xhsFeedPending || []).length > 0", timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
 def is_profile_url(text: str) -> bool:
     return 'xiaohongshu.com' in (text or '')
 
@@ -183,41 +298,58 @@ def load_cookies(path: str | None):
         return []
 
 
-def extract_post_links(page) -> list[str]:
-    anchors = page.locator('a[href*="/explore/"], a[href*="/discovery/item/"]')
-    hrefs = set()
-    count = anchors.count()
-    for i in range(count):
-        href = anchors.nth(i).get_attribute('href')
-        if not href:
-            continue
-        raw = href
-        if raw.startswith('/'):
-            raw = 'https://www.xiaohongshu.com' + raw
-        raw = raw.split('#')[0]
-        raw = raw.split('?')[0]
-        m1 = re.search(r'https?://www\.xiaohongshu\.com/explore/([0-9A-Za-z_-]{6,})', raw) or \
-             re.search(r'^/explore/([0-9A-Za-z_-]{6,})$', raw)
-        m2 = re.search(r'https?://www\.xiaohongshu\.com/discovery/item/([0-9A-Za-z_-]{6,})', raw) or \
-             re.search(r'^/discovery/item/([0-9A-Za-z_-]{6,})$', raw)
-        if m1:
-            hrefs.add(f'https://www.xiaohongshu.com/explore/{m1.group(1)}')
-        elif m2:
-            hrefs.add(f'https://www.xiaohongshu.com/discovery/item/{m2.group(1)}')
-    return list(hrefs)
-
-
-def scroll_to_load_all(page, limit: int | None = None, max_scrolls: int = DEFAULT_MAX_SCROLLS, idle_wait_ms: int = DEFAULT_IDLE_WAIT_MS) -> list[str]:
-    collected = set(extract_post_links(page))
+POST_LINK_RE = re.compile(r'^(?:https?://www\.xiaohongshu\.com)?/(explore|discovery/item)/([0-9A-Za-z_-]{6,})(?:/|$)')
+
+
+def normalize_post_link(href: str) -> str | None:
+    """将帖子链接规范化为 https://www.xiaohongshu.com/{explore|discovery/item}/{note_id}。"""
+    raw = (href or '').split('#')[0].split('?')[0]
+    m = POST_LINK_RE.match(raw)
+    return f'https://www.xiaohongshu.com/{m.group(1)}/{m.group(2)}' if m else None
+
+
+async def extract_new_post_links(page) -> list[str]:
+    """一次 evaluate 取出自上次调用以来新出现的帖子链接，仅对新 href 做规范化。"""
+    hrefs = await safe_eval(page, FEED_OBSERVER_SCRIPT, {'sel': POST_LINK_SELECTOR, 'harvest': True}) or []
+    links = (normalize_post_link(h) for h in hrefs)
+    return list(dict.fromkeys(u for u in links if u))
+
+
+def known_streak(note_ids, known_ids: set[str]) -> int:
+    """返回列表末尾连续已下载帖子的数量（主页按发布时间倒序，连续命中说明已到达上次抓取的位置）。"""
+    streak = 0
+    for note_id in reversed(list(note_ids)):
+        if note_id not in known_ids:
+            break
+        streak += 1
+    return streak
+
+
+async def scroll_to_load_all(page, limit: int | None = None, max_scrolls: int = DEFAULT_MAX_SCROLLS, idle_wait_ms: int = DEFAULT_IDLE_WAIT_MS, known_ids: set[str] | None = None, stop_after_known: int = 0, on_links=None) -> list[str]:
+    # 有序去重，保持主页上的出现顺序；on_links 在每批新链接出现时立即收到这些链接
+    collected = {}
+
+    def add(found: list[str]):
+        new = [u for u in dict.fromkeys(found) if u not in collected]
+        if limit:
+            new = new[:max(0, limit - len(collected))]
+        collected.update(dict.fromkeys(new))
+        if on_links and new:
+            on_links(new)
+
+    add(await extract_new_post_links(page))
     same_count_times = 0
     for i in range(max_scrolls):
         if limit and len(collected) >= limit:
             break
-        page.evaluate('window.scrollBy(0, document.body.scrollHeight)')
-        page.wait_for_timeout(idle_wait_ms)
-        new_links = set(extract_post_links(page))
+        if known_ids and stop_after_known and known_streak((extract_note_id_from_url(u) for u in collected), known_ids) >= stop_after_known:
+            print(f"[info] 连续 {stop_after_known} 个帖子已下载，停止滚动")
+            break
+        await page.evaluate('window.scrollBy(0, document.body.scrollHeight)')
+        # 新帖子节点插入后立即继续，idle_wait_ms 仅作为无新内容时的等待上限
+        await wait_for_new_feed_items(page, idle_wait_ms)
         before = len(collected)
-        collected |= new_links
+        add(await extract_new_post_links(page))
         after = len(collected)
         if after == before:
             same_count_times += 1
@@ -225,14 +357,319 @@ def scroll_to_load_all(page, limit: int | None = None, max_scrolls: int = DEFAUL
                 break
         else:
             same_count_times = 0
-    return list(collected)[:limit] if limit else list(collected)
+    return list(collected)
+
+
+USER_FEED_API = '/api/sns/web/v1/user_posted'
+
+PROFILE_STATE_SCRIPT = r"""
+() => {
+  try {
+    const unwrap = v => (v && v._rawValue !== undefined) ? v._rawValue : ((v && v._value !== undefined) ? v._value : v);
+    const user = unwrap(window.__INITIAL_STATE__ && window.__INITIAL_STATE__.user) || {};
+    const tabs = unwrap(user.notes) || [];
+    const first = Array.isArray(tabs[0]) ? tabs[0] : tabs;
+    const queries = unwrap(user.noteQueries) || [];
+    return JSON.parse(JSON.stringify({
+      notes: Array.isArray(first) ? first : [],
+      has_more: queries[0] && typeof queries[0].hasMore === 'boolean' ? queries[0].hasMore : null,
+    }));
+  } catch (e) {
+    return null;
+  }
+}
+"""
+
+
+def feed_note_from_item(item: dict) -> dict | None:
+    """将帖子列表接口或初始状态中的一项转换为 {'note_id', 'url', 'title', 'cover', 'xsec_token'}。"""
+    if not isinstance(item, dict):
+        return None
+    card = item.get('noteCard') or item.get('note_card') or item
+    note_id = item.get('note_id') or item.get('noteId') or card.get('note_id') or card.get('noteId') or item.get('id')
+    if not note_id:
+        return None
+    token = item.get('xsec_token') or item.get('xsecToken') or card.get('xsec_token') or card.get('xsecToken') or ''
+    cover = card.get('cover') or {}
+    url = f'https://www.xiaohongshu.com/explore/{note_id}'
+    if token:
+        url += f'?xsec_token={quote(token, safe="")}&xsec_source=pc_user'
+    return {
+        'note_id': note_id,
+        'url': url,
+        'title': card.get('display_title') or card.get('displayTitle') or card.get('title') or '',
+        'cover': cover.get('url_default') or cover.get('urlDefault') or cover.get('url') or '',
+        'xsec_token': token,
+    }
+
+
+def parse_feed_notes(payload: dict) -> tuple[list[dict], bool | None]:
+    """解析帖子列表接口响应。
+
+    Returns:
+        (帖子列表, has_more；未知时为 None)
+    """
+    data = (payload or {}).get('data') or {}
+    notes = [n for n in (feed_note_from_item(item) for item in data.get('notes') or []) if n]
+    has_more = data.get('has_more')
+    return notes, (has_more if isinstance(has_more, bool) else None)
+
+
+def install_feed_capture(page) -> dict:
+    """在主页上监听帖子列表接口（user_posted）响应，需在打开主页前调用。
+
+    Returns:
+        随响应更新的采集状态 {'notes': {note_id: 帖子}, 'has_more', 'responses', 'event'}
+    """
+    feed = {'notes': {}, 'has_more': None, 'responses': 0, 'event': asyncio.Event()}
+
+    async def on_response(response):
+        if USER_FEED_API not in response.url:
+            return
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        notes, has_more = parse_feed_notes(payload)
+        for note in notes:
+            feed['notes'].setdefault(note['note_id'], note)
+        if has_more is not None:
+            feed['has_more'] = has_more
+        feed['responses'] += 1
+        feed['event'].set()
 
+    page.on('response', on_response)
+    return feed
 
-def extract_post_content(page, url: str) -> dict:
-    title = try_get_meta(page, 'og:title') or page.title()
-    description = try_get_meta(page, 'og:description')
+
+async def harvest_profile_feed(page, feed: dict, limit: int | None = None, max_scrolls: int = DEFAULT_MAX_SCROLLS, idle_wait_ms: int = DEFAULT_IDLE_WAIT_MS, known_ids: set[str] | None = None, stop_after_known: int = 0, on_links=None) -> list[dict]:
+    """滚动主页并从帖子列表接口响应中收集帖子（含 xsec_token 与标题），按主页顺序返回。
+
+    首屏帖子取自初始状态；接口返回 has_more=false 时立即停止。
+    指定 known_ids 与 stop_after_known 时，连续出现 stop_after_known 个已下载帖子即停止。
+    on_links 在每批新帖子到达时收到其链接，供流式抓取使用。
+    """
+    emitted = 0
+
+    def emit():
+        nonlocal emitted
+        notes = list(feed['notes'].values())
+        notes = notes[:limit] if limit else notes
+        if on_links and len(notes) > emitted:
+            on_links([n['url'] for n in notes[emitted:]])
+        emitted = len(notes)
+
+    state = await safe_eval(page, PROFILE_STATE_SCRIPT) or {}
+    seeded = {}
+    for note in (feed_note_from_item(item) for item in state.get('notes') or []):
+        if note:
+            seeded.setdefault(note['note_id'], note)
+    # 首屏在前，其后是已到达的接口数据
+    feed['notes'] = {**seeded, **feed['notes']}
+    if feed['has_more'] is None and state.get('has_more') is not None:
+        feed['has_more'] = state['has_more']
+    same_count_times = 0
+    for i in range(max_scrolls):
+        emit()
+        if limit and len(feed['notes']) >= limit:
+            break
+        if feed['has_more'] is False:
+            break
+        if known_ids and stop_after_known and known_streak(feed['notes'], known_ids) >= stop_after_known:
+            print(f"[info] 连续 {stop_after_known} 个帖子已下载，停止滚动")
+            break
+        feed['event'].clear()
+        before = len(feed['notes'])
+        await page.evaluate('window.scrollBy(0, document.body.scrollHeight)')
+        try:
+            await asyncio.wait_for(feed['event'].wait(), idle_wait_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        if len(feed['notes']) == before:
+            same_count_times += 1
+            if same_count_times >= 5:
+                break
+        else:
+            same_count_times = 0
+    emit()
+    notes = list(feed['notes'].values())
+    return notes[:limit] if limit else notes
+
+
+NOTE_STATE_SCRIPT = r"""
+() => {
+  try {
+    const state = window.__INITIAL_STATE__;
+    const map = state && state.note && state.note.noteDetailMap;
+    if (!map) return null;
+    const id = state.note.currentNoteId || state.note.firstNoteId;
+    const entry = (id && map[id]) || Object.values(map).find(e => e && e.note && e.note.noteId);
+    return entry && entry.note ? JSON.parse(JSON.stringify(entry.note)) : null;
+  } catch (e) {
+    return null;
+  }
+}
+"""
+
+
+def original_image_url(url: str) -> str | None:
+    """由 CDN 展示图地址推导原图地址：去掉时间戳与签名路径段以及 `!样式` 后缀。"""
+    parts = [p for p in urlparse(url or '').path.split('/') if p]
+    if len(parts) < 3 or not re.fullmatch(r'\d{12}', parts[0]):
+        return None
+    token = '/'.join(parts[2:]).split('!')[0]
+    return f'https://sns-img-bd.xhscdn.com/{token}' if token else None
+
+
+def note_record_from_state(note: dict) -> dict | None:
+    """将初始状态中的 note 对象转换为与 NOTE_EXTRACT_SCRIPT 结构相同的记录。
+
+    Returns:
+        记录字典；缺少正文与图片等关键数据时返回 None
+    """
+    if not isinstance(note, dict):
+        return None
+    desc = note.get('desc') or ''
+    image_list = note.get('imageList') or []
+    if not (desc or image_list or note.get('video')):
+        return None
+    # 话题标签在 desc 中形如 #雅思[话题]#，按页面显示还原为 #雅思
+    desc = re.sub(r'#([^#\[\n]+)\[话题\]#', r'#\1', desc).strip()
+    images = []
+    swiper_images = []
+    image_fallbacks = {}
+    for img in image_list:
+        if not isinstance(img, dict):
+            continue
+        default = img.get('urlDefault') or img.get('url') or ''
+        if not default:
+            default = next((i.get('url') for i in img.get('infoList') or [] if i.get('imageScene') == 'WB_DFT' and i.get('url')), '')
+        if not default:
+            continue
+        if default.startswith('//'):
+            default = 'https:' + default
+        images.append(default)
+        original = original_image_url(default) or default
+        swiper_images.append(original)
+        image_fallbacks[original] = default
+    videos = []
+    stream = ((note.get('video') or {}).get('media') or {}).get('stream') or {}
+    for codec in ('h264', 'h265', 'av1'):
+        for item in stream.get(codec) or []:
+            if item.get('masterUrl'):
+                videos.append(item['masterUrl'])
+    title = (note.get('title') or '').strip()
+    return {
+        # 与 og:title 保持一致，便于沿用已有的文件命名
+        'title': f"{title} - 小红书" if title else '',
+        'description': desc[:200],
+        'detail_desc': desc,
+        'text_blocks': [],
+        'images': images,
+        'videos': videos,
+        'swiper_images': swiper_images,
+        'image_fallbacks': image_fallbacks,
+        'expanded': False,
+        'source': 'state',
+    }
+
+
+NOTE_EXTRACT_SCRIPT = r"""
+async () => {
+  const isMedia = (u) => typeof u === 'string' && u.length > 0 && !u.startsWith('data:');
+  const meta = (p) => document.querySelector(`meta[property="${p}"]`)?.content || null;
+  const descText = () => {
+    const root = document.querySelector('#detail-desc');
+    if (!root) return null;
+    const nt = root.querySelector('.note-text') || root;
+    const clone = nt.cloneNode(true);
+    // 将 <br> 转为换行，保留结构性换行
+    clone.querySelectorAll('br').forEach(br => br.replaceWith(document.createTextNode('\n')));
+    const text = (clone.textContent || '').replace(/\u00A0/g, ' ').trim();
+    if (text) return text;
+    const t = (nt.innerText || root.innerText || '').trim();
+    return t || null;
+  };
+  // 展开折叠正文，展开后等待正文变长（最多约 300ms）
+  let expanded = false;
+  const desc = document.querySelector('#detail-desc');
+  const scope = desc ? (desc.closest('.note-content') || desc.parentElement) : null;
+  if (scope) {
+    for (const label of ['展开全文', '展开', '更多']) {
+      const el = Array.from(scope.querySelectorAll('span, a, button, div'))
+        .find(e => e.children.length === 0 && (e.textContent || '').trim() === label);
+      if (!el) continue;
+      const before = (descText() || '').length;
+      el.click();
+      expanded = true;
+      for (let i = 0; i < 10 && (descText() || '').length <= before; i++) {
+        await new Promise(r => setTimeout(r, 30));
+      }
+      break;
+    }
+  }
+  const detailDesc = descText();
+  let textBlocks = [];
+  if (!detailDesc) {
+    const selectors = ['article', '[class*="content"]', '[class*="note"]', '[class*="RichText"]', '[data-test-id*="content"]'];
+    const container = selectors.map(s => document.querySelector(s)).find(Boolean) || document.body;
+    textBlocks = Array.from(container.querySelectorAll('h1, h2, p, span, div'))
+      .map(el => el.innerText)
+      .filter(t => t && t.trim().length > 0)
+      .slice(0, 80);
+  }
+  const swiperImages = Array.from(document.querySelectorAll('.swiper-slide .img-container img'))
+    .map(img => {
+      const src = img.getAttribute('src') || img.getAttribute('data-src') || '';
+      const srcset = img.getAttribute('srcset') || '';
+      let url = src;
+      if ((!url || url.length < 10) && srcset) {
+        const parts = srcset.split(',').map(s => s.trim().split(' ')[0]).filter(Boolean);
+        url = parts[parts.length - 1] || parts[0] || '';
+      }
+      return url;
+    })
+    .filter(u => typeof u === 'string' && /^https?:\/\//.test(u));
+  return {
+    title: meta('og:title') || document.title || '',
+    description: meta('og:description') || '',
+    detail_desc: detailDesc || '',
+    text_blocks: textBlocks,
+    images: Array.from(document.querySelectorAll('img'))
+      .map(img => img.getAttribute('src') || img.getAttribute('data-src') || '')
+      .filter(isMedia),
+    videos: Array.from(document.querySelectorAll('video, source'))
+      .map(v => v.getAttribute('src') || '')
+      .filter(isMedia),
+    swiper_images: swiperImages,
+    expanded,
+  };
+}
+"""
+
+
+async def extract_note_record(page) -> dict:
+    """提取帖子记录：优先读取页面内嵌的 __INITIAL_STATE__，其次一次 evaluate 抓取 DOM。
+
+    合并脚本执行失败时回退到逐项提取，返回结构相同的记录。
+    """
+    record = note_record_from_state(await safe_eval(page, NOTE_STATE_SCRIPT))
+    if record:
+        if not record['title']:
+            record['title'] = await page.title()
+        return record
+    record = await safe_eval(page, NOTE_EXTRACT_SCRIPT)
+    if isinstance(record, dict):
+        return record
+    return await extract_note_record_fallback(page)
+
+
+async def extract_note_record_fallback(page) -> dict:
+    """逐项提取帖子字段（多次浏览器往返），作为合并脚本的兜底。"""
+    title = await try_get_meta(page, 'og:title') or await page.title()
+    description = await try_get_meta(page, 'og:description')
     # images
-    imgs = safe_eval(
+    imgs = await safe_eval(
         page,
         """
 () => Array.from(document.querySelectorAll('img'))
@@ -241,7 +678,7 @@ def extract_post_content(page, url: str) -> dict:
 """
     ) or []
     # videos
-    videos = safe_eval(
+    videos = await safe_eval(
         page,
         """
 () => Array.from(document.querySelectorAll('video, source'))
@@ -250,9 +687,9 @@ def extract_post_content(page, url: str) -> dict:
 """
     ) or []
     # 优先抓取 #detail-desc 内 .note-text 的完整文本
-    detail_desc_text = extract_detail_desc_text(page)
+    detail_desc_text = await extract_detail_desc_text(page)
     # textual content fallback（当 detail-desc 不可用时）
-    text_blocks = [] if detail_desc_text else (safe_eval(
+    text_blocks = [] if detail_desc_text else (await safe_eval(
         page,
         """
 () => {
@@ -265,6 +702,30 @@ def extract_post_content(page, url: str) -> dict:
 }
 """
     ) or [])
+    return {
+        'title': title or '',
+        'description': description or '',
+        'detail_desc': detail_desc_text or '',
+        'text_blocks': text_blocks,
+        'images': imgs,
+        'videos': videos,
+        'swiper_images': await extract_swiper_images(page),
+        'expanded': False,
+    }
+
+
+async def extract_post_content(page, url: str) -> dict:
+    return post_data_from_record(url, await extract_note_record(page))
+
+
+def post_data_from_record(url: str, record: dict) -> dict:
+    """将提取记录整理为渲染/保存使用的帖子数据。"""
+    title = record.get('title') or ''
+    description = record.get('description') or ''
+    imgs = record.get('images') or []
+    videos = record.get('videos') or []
+    detail_desc_text = record.get('detail_desc') or ''
+    text_blocks = record.get('text_blocks') or []
     content_text = (detail_desc_text or ('\n'.join(dict.fromkeys(text_blocks)) if text_blocks else (description or '')))
 
     note_id = None
@@ -279,6 +740,8 @@ def extract_post_content(page, url: str) -> dict:
         'content_text': content_text or '',
         'images': list(dict.fromkeys(imgs)) if imgs else [],
         'videos': list(dict.fromkeys(videos)) if videos else [],
+        'swiper_images': list(dict.fromkeys(record.get('swiper_images') or [])),
+        'image_fallbacks': record.get('image_fallbacks') or {},
         'downloaded_images': [],
     }
 
@@ -380,6 +843,10 @@ def html_escape(s: str) -> str:
     return (s or '').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 
+def html_unescape(s: str) -> str:
+    return html.unescape(s or '')
+
+
 def save_html(html: str, out_dir: str | Path, filename: str) -> str:
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -406,11 +873,186 @@ def save_document(content: str, out_dir: str | Path, filename: str, skip_if_exis
     if skip_if_exists and path.exists():
         return None
     path.write_text(content, encoding='utf-8')
+    # 保存时同步写入全文检索索引，检索失败不影响保存
+    try:
+        open_search_index(out_dir).add(filename, *document_text(content, filename))
+    except Exception as e:
+        print(f"[warn] 写入检索索引失败 {filename}: {e}")
     return str(path)
 
 
+def document_text(content: str, filename: str) -> tuple[str | None, str]:
+    """从帖子文件内容中提取标题与纯文本正文（去除标题行、图片表格、视频链接与生成时间）。"""
+    if filename.endswith('.md'):
+        title_match = re.match(r'#\s+(.+)', content)
+        # 只跳过标题与小节标题（"# "、"## "），正文中的话题标签行（#雅思口语 #雅思备考）保留
+        skip = ('# ', '## ', '|', '- http', '生成时间：')
+        text = '\n'.join(line for line in content.splitlines() if not line.startswith(skip))
+        title = title_match.group(1).strip() if title_match else None
+    else:
+        title_match = re.search(r'<title>(.*?)</title>', content, re.S)
+        section = re.search(r'<section class="content">(.*?)</section>', content, re.S)
+        text = section.group(1) if section else re.sub(r'<(style|script|title)\b.*?</\1>', ' ', content, flags=re.S)
+        text = html_unescape(re.sub(r'<[^>]+>', ' ', text))
+        title = html_unescape(title_match.group(1)).strip() if title_match else None
+    return title, re.sub(r'\s+', ' ', text).strip()
+
+
+_SEARCH_INDEXES: dict[tuple[int, str], SearchIndex] = {}
+# document_text 的提取规则版本，变化后首次检索时重建已有帖子的索引
+DOCUMENT_TEXT_VERSION = 2
+# 补建检索索引时每个事务写入的帖子数
+SEARCH_INDEX_BATCH = 500
+
+
+def open_search_index(out_dir: str | Path) -> SearchIndex:
+    """打开输出目录的全文检索索引（search.db），同一进程内复用连接。"""
+    key = (os.getpid(), str(Path(out_dir).resolve()))
+    index = _SEARCH_INDEXES.get(key)
+    if index is None:
+        index = _SEARCH_INDEXES[key] = SearchIndex(str(Path(out_dir) / SEARCH_INDEX_FILENAME))
+        if not index.count() and not index.get_stat('text_version'):
+            index.set_stat('text_version', DOCUMENT_TEXT_VERSION)
+    return index
+
+
+def sync_search_index(out_dir: str | Path) -> int:
+    """为帖子目录中尚未建立检索索引的帖子补建索引（如检索功能加入之前保存的帖子），返回补建数量。
+
+    只检查上次同步之后新记录的帖子（按目录顺序号）；正文提取规则（DOCUMENT_TEXT_VERSION）变化后重建全部帖子的索引，
+    并移除帖子文件已被删除的索引记录。
+    """
+    out_dir = Path(out_dir)
+    index = open_search_index(out_dir)
+    catalog = open_catalog(out_dir)
+    stale = index.get_stat('text_version') < DOCUMENT_TEXT_VERSION
+    synced_seq = 0 if stale else index.get_stat('synced_seq')
+    last_seq = catalog.last_seq()
+    if synced_seq >= last_seq and not stale:
+        return 0
+    if stale:
+        print("[info] 正文提取规则已更新，正在重建检索索引（仅需一次）")
+        for path in index.paths():
+            if not (out_dir / path).exists():
+                index.remove(path)
+    indexed = set() if stale else index.paths()
+    pending = [
+        entry['file'] for entry in catalog.entries_between(synced_seq, last_seq)
+        if entry['file'] not in indexed and (out_dir / entry['file']).exists()
+    ]
+    if pending and not stale:
+        print(f"[info] 正在为 {len(pending)} 个帖子补建检索索引（仅首次需要）")
+    for i in range(0, len(pending), SEARCH_INDEX_BATCH):
+        index.add_many([(name, *document_text((out_dir / name).read_text(encoding='utf-8'), name)) for name in pending[i:i + SEARCH_INDEX_BATCH]])
+    index.set_stat('synced_seq', last_seq)
+    if stale:
+        index.set_stat('text_version', DOCUMENT_TEXT_VERSION)
+    return len(pending)
+
+
+def search_archive(out: str, query: str, limit: int = 20):
+    """在输出目录的已保存帖子中全文检索并打印结果，帖子文件已被删除的结果从索引中移除后重新检索。"""
+    if not Path(out).exists():
+        print(f"[warn] 输出目录不存在: {out}")
+        return
+    added = sync_search_index(out)
+    if added:
+        print(f"[info] 已为 {added} 个帖子补建检索索引")
+    index = open_search_index(out)
+    start = time.perf_counter()
+    while True:
+        results = index.search(query, limit=limit)
+        gone = [result['path'] for result in results if not (Path(out) / result['path']).exists()]
+        if not gone:
+            break
+        for path in gone:
+            index.remove(path)
+        print(f"[info] {len(gone)} 个帖子文件已删除，已从检索索引中移除")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"[info] 检索“{query}”：{len(results)} 个结果，用时 {elapsed_ms:.1f} ms")
+    for i, result in enumerate(results, 1):
+        print(f"{i}. {result['title'] or result['path']}  ({Path(out) / result['path']})")
+        print(f"   {result['snippet']}")
+
+
+_CATALOGS: dict[tuple[int, str], NoteCatalog] = {}
+
+
+def open_catalog(out_dir: str | Path) -> NoteCatalog:
+    """打开输出目录的帖子目录数据库，同一进程内复用连接。
+
+    首次在旧版输出目录（已有帖子文件但没有 catalog.db）中打开时，一次性导入已有帖子。
+    """
+    # 分片进程由 fork 创建时不能沿用父进程的连接
+    key = (os.getpid(), str(Path(out_dir).resolve()))
+    catalog = _CATALOGS.get(key)
+    if catalog is None:
+        catalog = _CATALOGS[key] = NoteCatalog(str(Path(out_dir) / CATALOG_FILENAME))
+        if catalog.get_meta('legacy_imported') is None:
+            imported = catalog.import_entries(scan_legacy_notes(out_dir))
+            catalog.set_meta('legacy_imported', '1')
+            if imported:
+                print(f"[info] 已将输出目录中的 {imported} 个帖子导入 {CATALOG_FILENAME}")
+        if catalog.get_meta('legacy_content_backfilled') is None:
+            # 早期导入的帖子没有图片列表与正文，从 images/ 与帖子文件中补齐
+            images = scan_note_images(out_dir)
+            for entry in catalog.entries():
+                path = Path(out_dir) / entry['file']
+                note_images = entry['images'] or images.get(entry['note_id'], [])
+                if (note_images == entry['images'] and entry['text'] is not None) or not path.exists():
+                    continue
+                text = entry['text'] if entry['text'] is not None else document_text(path.read_text(encoding='utf-8'), entry['file'])[1]
+                catalog.set_content(entry['note_id'], entry['format'], note_images, text)
+            catalog.set_meta('legacy_content_backfilled', '1')
+        if catalog.get_meta('legacy_urls_unescaped') is None:
+            # 早期导入时原帖链接保留了旧索引中的 HTML 实体（如 &amp;），在此修正一次
+            for entry in catalog.entries():
+                if '&amp;' in entry['url']:
+                    catalog.set_url(entry['note_id'], entry['format'], html_unescape(entry['url']))
+            catalog.set_meta('legacy_urls_unescaped', '1')
+    return catalog
+
+
+def scan_note_images(out_dir: str | Path) -> dict[str, list[str]]:
+    """扫描 images/ 目录，返回 note_id -> 按序号排列的图片相对路径（images/{note_id}_{序号}.ext）。"""
+    images_dir = Path(out_dir) / 'images'
+    found: dict[str, list[tuple[int, str]]] = {}
+    if images_dir.is_dir():
+        for item in os.scandir(images_dir):
+            m = re.match(r'^(.+)_(\d+)\.\w+$', item.name)
+            if m and item.is_file():
+                found.setdefault(m.group(1), []).append((int(m.group(2)), f"images/{item.name}"))
+    return {note_id: [path for _, path in sorted(paths)] for note_id, paths in found.items()}
+
+
+def scan_legacy_notes(out_dir: str | Path) -> list[dict]:
+    """扫描输出目录中已有的帖子文件，标题与原帖链接优先取自旧索引，图片与正文取自 images/ 与帖子文件，用于导入帖子目录。"""
+    out_dir = Path(out_dir)
+    indexed = {item['file']: item for item in load_existing_index(out_dir)}
+    images = scan_note_images(out_dir)
+    notes = []
+    for file_path in sorted(list(out_dir.glob('*.html')) + list(out_dir.glob('*.md'))):
+        # 文件名格式：note_id_title 或 note_id，note_id 为长度大于 6 的字母数字组合
+        parts = file_path.stem.split('_', 1)
+        note_id = parts[0]
+        if len(note_id) <= 6 or not re.match(r'^[0-9a-zA-Z_-]+$', note_id):
+            continue
+        item = indexed.get(file_path.name, {})
+        notes.append({
+            'note_id': note_id,
+            'url': html_unescape(item['url']) if item.get('url') else f"https://www.xiaohongshu.com/explore/{note_id}",
+            'title': html_unescape(item['title']) if item.get('title') else (parts[1] if len(parts) > 1 else None),
+            'file': file_path.name,
+            'format': 'markdown' if file_path.suffix == '.md' else 'html',
+            'images': images.get(note_id, []),
+            'text': document_text(file_path.read_text(encoding='utf-8'), file_path.name)[1],
+            'updated_at': file_path.stat().st_mtime,
+        })
+    return notes
+
+
 def load_existing_index(out_dir: str | Path) -> list[dict]:
-    """从已存在的索引文件中加载帖子列表。"""
+    """从旧版索引文件中加载帖子列表（仅在导入帖子目录时使用）。"""
     out_dir = Path(out_dir)
     existing_items = []
     
@@ -441,11 +1083,11 @@ def load_existing_index(out_dir: str | Path) -> list[dict]:
         try:
             content = index_md.read_text(encoding='utf-8')
             import re
-            # 匹配 Markdown 链接格式: - [标题](文件)  原帖: URL
-            pattern = r'- \[([^\]]+)\]\(([^\)]+)\)\s+原帖:\s+(\S+)'
+            # 匹配 Markdown 链接格式: - [标题](文件) 或 - [转义后的标题](<文件>)  原帖: URL
+            pattern = r'- \[((?:\\.|[^\]\\])+)\]\((?:<([^>]+)>|([^\)]+))\)\s+原帖:\s+(\S+)'
             matches = re.findall(pattern, content)
             for match in matches:
-                title, filename, url = match
+                title, filename, url = re.sub(r'\\(.)', r'\1', match[0]), match[1] or match[2], match[3]
                 if filename.endswith(('.html', '.md')) and 'xiaohongshu.com' in url:
                     existing_items.append({
                         'file': filename,
@@ -458,55 +1100,282 @@ def load_existing_index(out_dir: str | Path) -> list[dict]:
     return existing_items
 
 
-def build_index_html(items: list[dict], out_dir: str | Path, merge_existing: bool = True) -> str:
-    """构建索引 HTML，可选择合并已存在的索引。"""
-    if merge_existing:
-        existing = load_existing_index(out_dir)
-        # 按 URL 去重，新项目优先
-        seen_urls = {item['url'] for item in items}
-        existing_filtered = [item for item in existing if item.get('url') not in seen_urls]
-        items = items + existing_filtered
-    
-    head = """<!DOCTYPE html><html lang="zh-CN"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width, initial-scale=1.0"/><title>小红书爬取结果索引</title><style>
+INDEX_MD_HEAD = "# 小红书爬取结果索引\n\n"
+
+
+def render_index_item_markdown(item: dict) -> str:
+    # 标题中的 \、[、] 需转义，文件名用 <> 包裹以容纳空格与括号
+    title = re.sub(r'([\\\[\]])', r'\\\1', item.get('title') or item.get('note_id') or '未命名帖子')
+    return f"- [{title}](<{item.get('file')}>)  原帖: {item.get('url')}\n"
+
+
+def write_text_atomic(path: Path, content: str):
+    """先写临时文件再重命名，读取方不会看到写了一半的文件。"""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(content, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def update_index_file(out_dir: str | Path, name: str, head: str, tail: str, render_item, out_format: str | None = None) -> str:
+    """按帖子目录增量更新索引文件，条目按首次保存顺序排列，out_format 指定时只收录该格式的帖子文件。
+
+    帖子目录记录上次生成时的顺序号与文件大小：只有新帖子时把新条目写在结尾标记之前；
+    已收录的帖子有更新、索引文件被改动、收录格式变化或首次生成时整体重建（临时文件 + 重命名）。
+    """
+    out_dir = Path(out_dir)
+    catalog = open_catalog(out_dir)
+    index_path = out_dir / name
+    meta_key = f'index:{name}'
+    state = json.loads(catalog.get_meta(meta_key) or '{}')
+    built_at = time.time()
+    upto = catalog.last_seq()
+    tail_bytes = tail.encode('utf-8')
+    appendable = (
+        state and state.get('format') == out_format and index_path.exists() and index_path.stat().st_size == state['size']
+        and not catalog.updated_since(state['built_at'], state['seq'], out_format)
+    )
+    if appendable:
+        with open(index_path, 'r+b') as f:
+            f.seek(state['size'] - len(tail_bytes))
+            appendable = f.read() == tail_bytes
+            if appendable:
+                new_items = catalog.entries_between(state['seq'], upto, out_format)
+                if new_items:
+                    f.seek(state['size'] - len(tail_bytes))
+                    f.write(''.join(render_item(item) for item in new_items).encode('utf-8') + tail_bytes)
+                    f.truncate()
+    if not appendable:
+        write_text_atomic(index_path, head + ''.join(render_item(item) for item in catalog.entries_between(0, upto, out_format)) + tail)
+    catalog.set_meta(meta_key, json.dumps({'seq': upto, 'size': index_path.stat().st_size, 'built_at': built_at, 'format': out_format}))
+    return str(index_path)
+
+
+INDEX_PAGE_SIZE = 200
+INDEX_PAGES_DIRNAME = 'pages'
+# 检索结果中显示的正文摘要长度
+INDEX_SNIPPET_CHARS = 80
+INDEX_STYLE = """<style>
 body{font-family:system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial,sans-serif;line-height:1.6;padding:24px;max-width:980px;margin:0 auto;background:#fafafa;color:#222}
 h1{font-size:1.8rem;margin:0 0 12px}
+nav{margin:12px 0}
+nav a{margin-right:12px}
 ul{list-style:none;padding:0}
 li{margin:8px 0;padding:8px;background:#fff;border:1px solid #eee;border-radius:8px}
+li.card{display:flex;gap:12px;align-items:flex-start}
+.thumb{flex:0 0 96px;width:96px;height:96px;border-radius:6px;background:#f0f0f0;overflow:hidden}
+.thumb img{width:100%;height:100%;object-fit:cover}
+.card p{margin:4px 0 0;color:#555;font-size:.9rem}
 a{color:#1a73e8;text-decoration:none}
 a:hover{text-decoration:underline}
-small{color:#666}
-</style></head><body><h1>小红书爬取结果索引</h1><ul>"""
-    lis = ''.join(
-        f'<li><a href="{html_escape(item["file"])}" target="_blank">{html_escape(item["title"] or item.get("note_id") or "未命名帖子")}</a>'
-        f' <small>原帖: <a href="{html_escape(item["url"])}" target="_blank">{html_escape(item["url"])}</a></small></li>'
-        for item in items
+small{color:#666;word-break:break-all}
+input[type=search]{width:100%;box-sizing:border-box;padding:10px 12px;font-size:1rem;border:1px solid #ddd;border-radius:8px}
+</style>"""
+INDEX_SEARCH_SCRIPT = r"""<script>
+const TOKEN_RE = /([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+)|([0-9a-z]+)/g;
+function tokenize(text) {
+  const terms = [];
+  for (const m of text.toLowerCase().matchAll(TOKEN_RE)) {
+    if (m[1] === undefined) terms.push(m[2]);
+    else if (m[1].length === 1) terms.push(m[1]);
+    else for (let i = 0; i < m[1].length - 1; i++) terms.push(m[1].slice(i, i + 2));
+  }
+  return terms;
+}
+// 二元组精确查找；单个汉字与字母数字按包含/前缀匹配检索词
+function postings(seg, term) {
+  const cjk = /[^0-9a-z]/.test(term);
+  if (cjk && term.length > 1) return seg.terms[term] || [];
+  const ids = new Set();
+  for (const key in seg.terms) {
+    if (cjk ? key.includes(term) : key.startsWith(term)) for (const id of seg.terms[key]) ids.add(id);
+  }
+  return [...ids];
+}
+let loading = null;
+function loadSegments() {
+  // file:// 下无法 fetch，改为按需插入 script 标签加载各页的检索数据
+  loading = loading || Promise.all(PAGES.map(page => new Promise(resolve => {
+    const el = document.createElement('script');
+    el.src = `pages/${String(page).padStart(4, '0')}.search.js`;
+    el.onload = el.onerror = resolve;
+    document.head.appendChild(el);
+  })));
+  return loading;
+}
+function card(doc) {
+  const li = document.createElement('li');
+  li.className = 'card';
+  const thumb = document.createElement('a');
+  thumb.className = 'thumb';
+  thumb.href = doc[0];
+  thumb.target = '_blank';
+  if (doc[2]) {
+    const img = document.createElement('img');
+    img.loading = 'lazy';
+    img.src = doc[2];
+    img.alt = '';
+    thumb.appendChild(img);
+  }
+  const body = document.createElement('div');
+  const link = document.createElement('a');
+  link.href = doc[0];
+  link.target = '_blank';
+  link.textContent = doc[1];
+  const snippet = document.createElement('p');
+  snippet.textContent = doc[3];
+  body.append(link, snippet);
+  li.append(thumb, body);
+  return li;
+}
+async function search(query) {
+  const results = document.getElementById('results');
+  const terms = [...new Set(tokenize(query))];
+  results.replaceChildren();
+  document.getElementById('summary').textContent = '';
+  if (!terms.length) return;
+  await loadSegments();
+  const hits = [];
+  for (const page of PAGES.slice().reverse()) {
+    const seg = (window.XHS_SEARCH || {})[page];
+    if (!seg) continue;
+    let ids = null;
+    for (const term of terms) {
+      const found = new Set(postings(seg, term));
+      ids = ids === null ? found : new Set([...ids].filter(id => found.has(id)));
+      if (!ids.size) break;
+    }
+    for (const id of [...ids].reverse()) {
+      const doc = seg.docs[id];
+      hits.push({doc, score: doc[1].toLowerCase().includes(query.toLowerCase()) ? 1 : 0});
+    }
+  }
+  hits.sort((a, b) => b.score - a.score);
+  document.getElementById('summary').textContent = `找到 ${hits.length} 个帖子`;
+  for (const hit of hits.slice(0, 200)) results.appendChild(card(hit.doc));
+}
+let timer = null;
+document.getElementById('q').addEventListener('input', e => {
+  clearTimeout(timer);
+  timer = setTimeout(() => search(e.target.value.trim()), 150);
+});
+</script>"""
+
+
+def index_page_name(page: int) -> str:
+    return f"{page:04d}.html"
+
+
+def render_index_card(item: dict, prefix: str = '') -> str:
+    """索引中的单个帖子：本地首图缩略图（延迟加载）、标题、原帖链接与正文摘要。"""
+    file = html_escape(prefix + item['file'])
+    thumb = item['images'][0] if item.get('images') else None
+    img = f'<img loading="lazy" decoding="async" src="{html_escape(prefix + thumb)}" alt=""/>' if thumb else ''
+    snippet = (item.get('text') or '')[:INDEX_SNIPPET_CHARS]
+    return (
+        f'<li class="card"><a class="thumb" href="{file}" target="_blank">{img}</a><div>'
+        f'<a href="{file}" target="_blank">{html_escape(item["title"] or item.get("note_id") or "未命名帖子")}</a>'
+        f' <small>原帖: <a href="{html_escape(item["url"])}" target="_blank">{html_escape(item["url"])}</a></small>'
+        f'{f"<p>{html_escape(snippet)}</p>" if snippet else ""}</div></li>'
     )
-    tail = '</ul></body></html>'
-    index_path = Path(out_dir) / 'index.html'
-    index_path.write_text(head + lis + tail, encoding='utf-8')
-    return str(index_path)
 
 
-def build_index_markdown(items: list[dict], out_dir: str | Path, merge_existing: bool = True) -> str:
-    """构建索引 Markdown，可选择合并已存在的索引。"""
-    if merge_existing:
-        existing = load_existing_index(out_dir)
-        # 按 URL 去重，新项目优先
-        seen_urls = {item['url'] for item in items}
-        existing_filtered = [item for item in existing if item.get('url') not in seen_urls]
-        items = items + existing_filtered
-    
-    lines = ["# 小红书爬取结果索引", ""]
-    for item in items:
+def render_index_page(page: int, items: list[dict], prev_page: int | None, next_page: int | None) -> str:
+    """渲染一个分页（位于 pages/ 目录，链接以 ../ 指向输出目录）。"""
+    nav = ['<a href="../index.html">检索与全部分页</a>']
+    if prev_page:
+        nav.append(f'<a href="{index_page_name(prev_page)}">上一页</a>')
+    if next_page:
+        nav.append(f'<a href="{index_page_name(next_page)}">下一页</a>')
+    nav_html = f"<nav>{''.join(nav)}</nav>"
+    return (
+        f'<!DOCTYPE html><html lang="zh-CN"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width, initial-scale=1.0"/>'
+        f'<title>小红书爬取结果索引 - 第 {page} 页</title>{INDEX_STYLE}</head><body><h1>小红书爬取结果索引 · 第 {page} 页</h1>{nav_html}<ul>'
+        + ''.join(render_index_card(item, '../') for item in items)
+        + f'</ul>{nav_html}</body></html>'
+    )
+
+
+def build_search_segment(page: int, items: list[dict]) -> str:
+    """生成一个分页的检索数据：二元组倒排表（检索词 -> 页内序号）与结果展示所需字段。
+
+    以 JS 文件形式输出（赋值到 window.XHS_SEARCH），本地以 file:// 打开索引时也能加载。
+    """
+    docs = []
+    terms: dict[str, list[int]] = {}
+    for i, item in enumerate(items):
+        text = item.get('text') or ''
         title = item.get('title') or item.get('note_id') or '未命名帖子'
-        file = item.get('file')
-        url = item.get('url')
-        lines.append(f"- [{title}]({file})  原帖: {url}")
-    index_path = Path(out_dir) / 'index.md'
-    index_path.write_text("\n".join(lines), encoding='utf-8')
+        docs.append([item['file'], title, item['images'][0] if item.get('images') else '', text[:INDEX_SNIPPET_CHARS]])
+        for term in dict.fromkeys(tokenize(f"{title} {text}")):
+            terms.setdefault(term, []).append(i)
+    payload = json.dumps({'docs': docs, 'terms': terms}, ensure_ascii=False, separators=(',', ':'))
+    return f"(window.XHS_SEARCH = window.XHS_SEARCH || {{}})[{page}] = {payload};\n"
+
+
+def render_index_home(page_counts: dict[int, int]) -> str:
+    """渲染 index.html：离线检索框与分页目录（最新的分页在前）。"""
+    total = sum(page_counts.values())
+    pages = sorted(page_counts)
+    links = ''.join(
+        f'<li><a href="{INDEX_PAGES_DIRNAME}/{index_page_name(page)}">第 {page} 页</a> <small>{page_counts[page]} 个帖子</small></li>'
+        for page in reversed(pages)
+    )
+    return (
+        f'<!DOCTYPE html><html lang="zh-CN"><head><meta charset="utf-8"/><meta name="viewport" content="width=device-width, initial-scale=1.0"/>'
+        f'<title>小红书爬取结果索引</title>{INDEX_STYLE}</head><body><h1>小红书爬取结果索引</h1>'
+        f'<input id="q" type="search" placeholder="检索标题与正文（共 {total} 个帖子）" autofocus/>'
+        f'<p><small id="summary"></small></p><ul id="results"></ul><h2>全部分页</h2><ul>{links}</ul>'
+        f'<script>const PAGES = {json.dumps(pages)};</script>{INDEX_SEARCH_SCRIPT}</body></html>'
+    )
+
+
+def build_index_html(out_dir: str | Path, out_format: str = 'html') -> str:
+    """由帖子目录生成分页索引：pages/ 下每页 INDEX_PAGE_SIZE 个帖子及其检索数据，index.html 为检索页与分页目录。
+
+    只收录 out_format 格式的帖子文件（同一目录中同时保存了 HTML 与 Markdown 时每个帖子只出现一次）。
+    帖子按首次保存顺序分页，已有分页的内容不随新帖子变化；每次只重写新增帖子所在的分页、
+    有帖子更新的分页与 index.html，所有文件均先写临时文件再替换；收录格式变化时全部重写。
+    """
+    out_dir = Path(out_dir)
+    catalog = open_catalog(out_dir)
+    pages_dir = out_dir / INDEX_PAGES_DIRNAME
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    state = json.loads(catalog.get_meta('index:pages') or '{}')
+    built_at = time.time()
+    upto = catalog.last_seq()
+    counts = catalog.page_counts(INDEX_PAGE_SIZE, upto, out_format)
+    pages = sorted(counts)
+
+    def page_of(seq: int) -> int:
+        return (seq - 1) // INDEX_PAGE_SIZE + 1
+
+    if state.get('page_size') == INDEX_PAGE_SIZE and state.get('format') == out_format:
+        dirty = {page_of(seq) for seq in catalog.updated_seqs(state['built_at'], state['seq'], out_format)}
+        if upto > state['seq']:
+            # 原最后一页可能新增帖子或需要补上“下一页”链接
+            dirty.update(range(page_of(max(state['seq'], 1)), page_of(upto) + 1))
+        dirty.update(page for page in pages if not (pages_dir / index_page_name(page)).exists())
+    else:
+        dirty = set(pages)
+    for i, page in enumerate(pages):
+        if page not in dirty:
+            continue
+        items = catalog.entries_between((page - 1) * INDEX_PAGE_SIZE, min(page * INDEX_PAGE_SIZE, upto), out_format)
+        prev_page = pages[i - 1] if i > 0 else None
+        next_page = pages[i + 1] if i + 1 < len(pages) else None
+        write_text_atomic(pages_dir / index_page_name(page), render_index_page(page, items, prev_page, next_page))
+        write_text_atomic(pages_dir / f"{page:04d}.search.js", build_search_segment(page, items))
+    index_path = out_dir / 'index.html'
+    write_text_atomic(index_path, render_index_home(counts))
+    catalog.set_meta('index:pages', json.dumps({'seq': upto, 'built_at': built_at, 'page_size': INDEX_PAGE_SIZE, 'format': out_format}))
     return str(index_path)
 
 
+def build_index_markdown(out_dir: str | Path) -> str:
+    """由帖子目录生成（或增量更新）索引 Markdown。"""
+    return update_index_file(out_dir, 'index.md', INDEX_MD_HEAD, '', render_index_item_markdown, 'markdown')
+
+
 def extract_note_id_from_url(url: str) -> str | None:
     """从 URL 中提取 note_id。"""
     m = re.search(r'/explore/([0-9a-zA-Z_-]+)', url) or re.search(r'/discovery/item/([0-9a-zA-Z_-]+)', url)
@@ -514,27 +1383,12 @@ def extract_note_id_from_url(url: str) -> str | None:
 
 
 def get_existing_note_ids(out_dir: str | Path, out_format: str = 'html') -> set[str]:
-    """从输出目录中提取所有已存在的 note_id。"""
+    """从帖子目录中查询指定格式已保存的 note_id，帖子文件已被删除的不计入（以便重新下载）。"""
     out_dir = Path(out_dir)
     if not out_dir.exists():
         return set()
-    
-    note_ids = set()
-    ext = 'html' if out_format == 'html' else 'md'
-    
-    # 遍历输出目录中的所有文件
-    for file_path in out_dir.glob(f'*.{ext}'):
-        filename = file_path.stem  # 获取不带扩展名的文件名
-        # 文件名格式：note_id_title 或 note_id
-        # 提取第一个下划线之前的部分作为 note_id
-        parts = filename.split('_', 1)
-        if parts:
-            potential_id = parts[0]
-            # 验证是否是有效的 note_id 格式（长度大于 6 的字母数字组合）
-            if len(potential_id) > 6 and re.match(r'^[0-9a-zA-Z_-]+$', potential_id):
-                note_ids.add(potential_id)
-    
-    return note_ids
+    files = open_catalog(out_dir).note_files('html' if out_format == 'html' else 'markdown')
+    return {note_id for note_id, file in files.items() if (out_dir / file).exists()}
 
 
 def deduplicate_and_filter_links(links: list[str], existing_note_ids: set[str] = None, skip_existing: bool = False) -> tuple[list[str], int, int]:
@@ -568,9 +1422,9 @@ def deduplicate_and_filter_links(links: list[str], existing_note_ids: set[str] =
     return unique_links, duplicate_count, 0
 
 
-def extract_swiper_images(page) -> list[str]:
+async def extract_swiper_images(page) -> list[str]:
     """提取轮播区域图片（`.swiper-slide .img-container img`）。"""
-    urls = safe_eval(
+    urls = await safe_eval(
         page,
         """
 () => Array.from(document.querySelectorAll('.swiper-slide .img-container img'))
@@ -610,37 +1464,183 @@ def infer_ext_from_content_type(ct: str | None) -> str:
     return mapping.get(ct, mimetypes.guess_extension(ct) or '.jpg')
 
 
-def download_images(urls: list[str], images_dir: Path, prefix: str, referer: str | None = None, user_agent: str | None = None) -> list[str]:
-    images_dir.mkdir(parents=True, exist_ok=True)
-    saved = []
-    for i, u in enumerate(urls, start=1):
+class ImageDownloader:
+    """图片下载服务：共享 keep-alive 连接池，按主机限制并发，流式写入临时文件后原子重命名。
+
+    store_images 为 True 时图片存入按内容寻址的 ImageStore：相同内容只保存一份，
+    来源 URL 或 ETag 已知的图片不再下载内容。
+    线程安全，同一进程内的所有帖子共用一个实例；用完后调用 close()。
+    """
+
+    def __init__(self, user_agent: str | None = None, per_host: int = DEFAULT_IMAGE_CONCURRENCY, timeout: float = 20, store_images: bool = False):
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.store_images = store_images
+        self._stores: dict[Path, ImageStore] = {}
+        # 连接池与线程数覆盖两个图片主机（原图与展示图）同时满载的情况
+        pool_size = self.per_host * 2
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': user_agent or DEFAULT_USER_AGENT,
+            'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8',
+        })
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='image')
+        self._host_slots: dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _store(self, images_dir: Path) -> ImageStore | None:
+        if not self.store_images:
+            return None
+        with self._lock:
+            if images_dir not in self._stores:
+                self._stores[images_dir] = ImageStore(str(images_dir))
+            return self._stores[images_dir]
+
+    def _write_atomic(self, path: Path, chunks, url: str | None = None, etag: str | None = None) -> str:
+        """写入同目录临时文件后重命名（或存入 ImageStore），中断时不会留下不完整的图片。"""
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.part")
         try:
-            headers = {
-                'User-Agent': user_agent or DEFAULT_USER_AGENT,
-                'Referer': referer or 'https://www.xiaohongshu.com/',
-                'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8',
-            }
-            resp = requests.get(u, headers=headers, timeout=20, stream=True)
-            if resp.status_code != 200:
-                print(f"[warn] 下载失败({resp.status_code}): {u}")
-                continue
-            ext = os.path.splitext(urlparse(u).path)[1]
-            if not ext or len(ext) > 5:
-                ext = infer_ext_from_content_type(resp.headers.get('Content-Type'))
-            fname = f"{prefix}_{i}{ext}"
-            path = images_dir / fname
-            with open(path, 'wb') as f:
-                for chunk in resp.iter_content(8192):
+            with open(tmp, 'wb') as f:
+                for chunk in chunks:
                     if chunk:
                         f.write(chunk)
-            saved.append(str(path))
-        except Exception as e:
-            print(f"[warn] 下载异常: {e}")
-            continue
-    return saved
+            store = self._store(path.parent)
+            if store is not None:
+                return store.commit(tmp, path, url, etag)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        return str(path)
+
+    def fetch(self, url: str, images_dir: Path, name: str, referer: str | None = None) -> str | None:
+        """下载单张图片保存为 {name}{扩展名}，失败返回 None。"""
+        store = self._store(images_dir)
+        if store is not None:
+            linked = store.link_known(url, images_dir / name, url)
+            if linked:
+                return linked
+        with self._host_slot(url):
+            try:
+                with self.session.get(url, headers={'Referer': referer or 'https://www.xiaohongshu.com/'}, timeout=self.timeout, stream=True) as resp:
+                    if resp.status_code != 200:
+                        print(f"[warn] 下载失败({resp.status_code}): {url}")
+                        return None
+                    etag = resp.headers.get('ETag')
+                    if store is not None and etag:
+                        # 相同 ETag 的内容已保存过，无需读取响应体
+                        linked = store.link_known(etag, images_dir / name, url, by='etags')
+                        if linked:
+                            return linked
+                    ext = os.path.splitext(urlparse(url).path)[1]
+                    if not ext or len(ext) > 5:
+                        ext = infer_ext_from_content_type(resp.headers.get('Content-Type'))
+                    return self._write_atomic(images_dir / f"{name}{ext}", resp.iter_content(65536), url, etag)
+            except Exception as e:
+                print(f"[warn] 下载异常: {e}")
+                return None
+
+    def _download_one(self, i: int, u: str, images_dir: Path, prefix: str, referer: str | None, fallbacks: dict | None, captured: dict | None) -> str | None:
+        if captured and u in captured:
+            source_url, content_type, body = captured[u]
+            ext = os.path.splitext(urlparse(source_url).path)[1]
+            if not ext or len(ext) > 5:
+                ext = infer_ext_from_content_type(content_type)
+            return self._write_atomic(images_dir / f"{prefix}_{i}{ext}", [body], source_url)
+        candidates = [u]
+        if fallbacks and fallbacks.get(u) and fallbacks[u] != u:
+            candidates.append(fallbacks[u])
+        for candidate in candidates:
+            path = self.fetch(candidate, images_dir, f"{prefix}_{i}", referer)
+            if path:
+                return path
+        return None
+
+    def download(self, urls: list[str], images_dir: Path, prefix: str, referer: str | None = None, fallbacks: dict[str, str] | None = None, captured: dict[str, tuple] | None = None) -> list[str]:
+        """并发下载一个帖子的图片，返回按原顺序排列的已保存路径（文件名序号与 urls 位置一致）。"""
+        images_dir.mkdir(parents=True, exist_ok=True)
+        futures = [self._executor.submit(self._download_one, i, u, images_dir, prefix, referer, fallbacks, captured) for i, u in enumerate(urls, start=1)]
+        return [path for path in (f.result() for f in futures) if path]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        for store in self._stores.values():
+            try:
+                store.save()
+            except Exception as e:
+                print(f"[warn] 保存图片清单失败: {e}")
+            if store.hits:
+                print(f"[info] 图片去重: 复用已保存内容 {store.hits} 张，新增 {store.stored} 张")
+
+
+def download_images(urls: list[str], images_dir: Path, prefix: str, referer: str | None = None, user_agent: str | None = None, fallbacks: dict[str, str] | None = None, captured: dict[str, tuple] | None = None, downloader: ImageDownloader | None = None) -> list[str]:
+    """下载图片，保存为 {prefix}_{序号}{扩展名}。
+
+    fallbacks 为 {url: 备用地址}，主地址下载失败时尝试备用地址（如原图失败时回退到展示图）。
+    captured 为 {url: (来源地址, content-type, 内容)}，已由浏览器加载的图片直接写入，不再请求。
+    未传入 downloader 时临时创建一个，用完即关闭。
+    """
+    if downloader is not None:
+        return downloader.download(urls, images_dir, prefix, referer, fallbacks, captured)
+    downloader = ImageDownloader(user_agent=user_agent)
+    try:
+        return downloader.download(urls, images_dir, prefix, referer, fallbacks, captured)
+    finally:
+        downloader.close()
+
 
+def _response_key(url: str) -> str:
+    """忽略协议差异（http/https）比较图片地址。"""
+    return (url or '').split('://', 1)[-1]
 
-def cache_note_info(links: list[str], out_dir: str | Path, context, timeout_ms: int) -> dict[str, dict]:
+
+def remember_image_response(responses: dict, response) -> None:
+    """page.on('response') 回调：记录成功加载的图片响应。"""
+    try:
+        if response.ok and response.request.resource_type == 'image':
+            responses[_response_key(response.url)] = response
+    except Exception:
+        pass
+
+
+async def collect_captured_images(responses: dict, urls: list[str], fallbacks: dict[str, str] | None = None) -> dict[str, tuple]:
+    """为轮播图片匹配浏览器已加载的响应并读取响应体。
+
+    原图地址未被页面加载时，匹配其展示图地址（即页面实际渲染的图片）。
+
+    Returns:
+        {url: (来源地址, content-type, 内容)}
+    """
+    captured = {}
+    for u in urls:
+        for candidate in (u, (fallbacks or {}).get(u)):
+            response = responses.get(_response_key(candidate)) if candidate else None
+            if response is None:
+                continue
+            try:
+                body = await response.body()
+            except Exception:
+                continue
+            if body:
+                captured[u] = (response.url, response.headers.get('content-type'), body)
+                break
+    if captured:
+        print(f"[info] 复用浏览器已加载的图片: {len(captured)}/{len(urls)}")
+    return captured
+
+
+async def cache_note_info(links: list[str], out_dir: str | Path, context, timeout_ms: int, page_recycle: dict | None = None) -> dict[str, dict]:
     """获取并缓存帖子标题信息。
     
     Returns:
@@ -672,16 +1672,19 @@ def cache_note_info(links: list[str], out_dir: str | Path, context, timeout_ms:
     # 获取未缓存的帖子信息
     if links_to_fetch:
         print(f"[info] 需要获取 {len(links_to_fetch)} 个帖子的标题...")
+        pages = new_page_pool(context, timeout_ms, page_recycle)
         for idx, url in enumerate(links_to_fetch, start=1):
             try:
                 print(f"[info] [{idx}/{len(links_to_fetch)}] 获取标题: {url}")
-                page = context.new_page()
-                page.set_default_navigation_timeout(timeout_ms)
-                page.set_default_timeout(timeout_ms)
+                page = await pages.acquire()
+                reusable = False
                 try:
-                    page.goto(url, wait_until='domcontentloaded')
-                    page.wait_for_timeout(800)  # 短暂等待
-                    title = try_get_meta(page, 'og:title') or page.title()
+                    await page.goto(url, wait_until='domcontentloaded')
+                    try:
+                        await page.wait_for_selector('meta[property="og:title"]', state='attached', timeout=800)
+                    except Exception:
+                        pass
+                    title = await try_get_meta(page, 'og:title') or await page.title()
                     note_id = extract_note_id_from_url(url)
                     info = {
                         'title': title or '',
@@ -689,14 +1692,16 @@ def cache_note_info(links: list[str], out_dir: str | Path, context, timeout_ms:
                     }
                     notes_info[url] = info
                     cached_data[url] = info
+                    reusable = True
                 except Exception as e:
                     print(f"[warn] 获取标题失败: {e}")
                     notes_info[url] = {'title': '', 'note_id': extract_note_id_from_url(url) or ''}
                 finally:
-                    page.close()
+                    await pages.release(page, reusable)
             except Exception as e:
                 print(f"[warn] 处理帖子失败: {e}")
                 notes_info[url] = {'title': '', 'note_id': extract_note_id_from_url(url) or ''}
+        await pages.close()
         
         # 保存缓存
         try:
@@ -733,39 +1738,837 @@ def filter_links_by_keyword(links: list[str], notes_info: dict[str, dict], keywo
         return keyword_links, other_links
 
 
-def run(user: str, out: str, cookies_path: str | None = None, limit: int | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, note_keyword: str | None = None, keyword_only: bool = False):
-    profile_url = build_profile_url(user)
-    print(f"[info] 打开用户主页: {profile_url}")
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=headless)
-        context = browser.new_context(
-            user_agent=user_agent or DEFAULT_USER_AGENT,
-            viewport={"width": 1366, "height": 860},
-            locale="zh-CN",
-            timezone_id="Asia/Shanghai",
-        )
-        cookies = load_cookies(cookies_path)
-        if cookies:
-            print(f"[info] 导入 cookies: {len(cookies)} 条")
+def build_block_policy(preset: str = 'none', block_types: list[str] | None = None, deny_patterns: list[str] | None = None, allow_patterns: list[str] | None = None) -> dict | None:
+    """根据预设与自定义规则构建请求拦截策略。
+
+    allow_patterns 优先级最高，匹配的请求始终放行；document 请求从不拦截。
+
+    Returns:
+        策略字典，无任何拦截规则时返回 None
+    """
+    if preset not in BLOCK_PRESETS:
+        raise ValueError(f"未知的拦截预设: {preset}，可选: {', '.join(BLOCK_PRESETS)}")
+    base = BLOCK_PRESETS[preset]
+    resource_types = set(base['resource_types']) | set(block_types or [])
+    resource_types.discard('document')
+    policy = {
+        'resource_types': resource_types,
+        'deny_patterns': [re.compile(p) for p in list(base['deny_patterns']) + list(deny_patterns or [])],
+        'allow_patterns': [re.compile(p) for p in (allow_patterns or [])],
+        'download_images': base['download_images'],
+    }
+    if not policy['resource_types'] and not policy['deny_patterns']:
+        return None
+    return policy
+
+
+def should_block_request(policy: dict | None, resource_type: str, url: str) -> bool:
+    """判断请求是否应被拦截。"""
+    if not policy or resource_type == 'document':
+        return False
+    if any(p.search(url) for p in policy['allow_patterns']):
+        return False
+    if resource_type in policy['resource_types']:
+        return True
+    return any(p.search(url) for p in policy['deny_patterns'])
+
+
+async def install_block_policy(context, policy: dict | None):
+    """在浏览器上下文上安装请求拦截，作用于其创建的所有页面。"""
+    if not policy:
+        return
+
+    async def handle(route):
+        request = route.request
+        try:
+            if should_block_request(policy, request.resource_type, request.url):
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception:
+            # 页面已关闭等情况下路由可能失效，忽略即可
+            pass
+
+    await context.route('**/*', handle)
+
+
+async def install_asset_cache(context, options: dict | None, policy: dict | None = None):
+    """在浏览器上下文上安装静态资源磁盘缓存（{'dir', 'max_bytes'}），上下文关闭时保存索引并输出命中统计。
+
+    需在 install_block_policy 之后调用：后注册的路由先执行，非缓存资源交回拦截规则处理。
+    """
+    if not options:
+        return
+    cache = AssetCache(options['dir'], options.get('max_bytes', DEFAULT_ASSET_CACHE_MB * 1024 * 1024))
+
+    async def handle(route):
+        request = route.request
+        try:
+            if not is_cacheable_asset(request.url, request.resource_type) or should_block_request(policy, request.resource_type, request.url):
+                await route.fallback()
+                return
+            cached = cache.get(request.url)
+            if cached is not None:
+                body, headers = cached
+                await route.fulfill(status=200, headers=headers, body=body)
+                return
+            response = await route.fetch()
+            body = await response.body()
+            if response.ok:
+                cache.put(request.url, body, response.headers)
+            await route.fulfill(response=response, body=body)
+        except Exception:
+            # 页面已关闭或请求失败时交回默认处理
             try:
-                context.add_cookies(cookies)
+                await route.fallback()
+            except Exception:
+                pass
+
+    def on_close(_):
+        try:
+            cache.save()
+        except Exception as e:
+            print(f"[warn] 保存静态资源缓存失败: {e}")
+        stats = cache.stats()
+        print(f"[info] 静态资源缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，淘汰 {stats['evicted']}，共 {stats['entries']} 个 {stats['bytes'] / 1024 / 1024:.1f} MB")
+
+    await context.route('**/*', handle)
+    context.on('close', on_close)
+
+
+def profile_state_path(profile_dir: str | Path) -> Path:
+    """持久化浏览器目录中导出的登录状态文件（供分片进程与 HTTP 模式使用）。"""
+    return Path(profile_dir) / 'storage_state.json'
+
+
+def load_profile_cookies(profile_dir: str | Path | None) -> list[dict]:
+    """从持久化浏览器目录上次导出的登录状态中读取 cookies，不存在时返回空列表。"""
+    if not profile_dir or not profile_state_path(profile_dir).exists():
+        return []
+    return load_cookies(str(profile_state_path(profile_dir)))
+
+
+async def new_browser_context(pw, headless: bool = True, user_agent: str | None = None, cookies: list[dict] | None = None, block_policy: dict | None = None, profile_dir: str | None = None, storage_state: str | None = None, asset_cache: dict | None = None):
+    """启动 Chromium 并创建带统一 UA/视口/cookies 的上下文。
+
+    指定 profile_dir 时使用持久化上下文，磁盘缓存、Service Worker 与登录状态在多次运行间保留，
+    此时返回的 browser 为 None；storage_state 用于以导出的登录状态创建普通上下文。
+
+    Returns:
+        (browser, context)
+    """
+    options = dict(
+        user_agent=user_agent or DEFAULT_USER_AGENT,
+        viewport={"width": 1366, "height": 860},
+        locale="zh-CN",
+        timezone_id="Asia/Shanghai",
+    )
+    if profile_dir:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        print(f"[info] 使用持久化浏览器目录: {profile_dir}")
+        browser = None
+        context = await pw.chromium.launch_persistent_context(str(profile_dir), headless=headless, **options)
+    else:
+        browser = await pw.chromium.launch(headless=headless)
+        context = await browser.new_context(storage_state=storage_state, **options)
+    if cookies:
+        print(f"[info] 导入 cookies: {len(cookies)} 条")
+        try:
+            await context.add_cookies(cookies)
+        except Exception as e:
+            print(f"[warn] 添加 cookies 失败: {e}")
+    await install_block_policy(context, block_policy)
+    await install_asset_cache(context, asset_cache, block_policy)
+    return browser, context
+
+
+async def close_browser_context(browser, context, profile_dir: str | None = None):
+    """关闭上下文与浏览器；持久化模式下先导出登录状态。"""
+    if profile_dir:
+        try:
+            await context.storage_state(path=str(profile_state_path(profile_dir)))
+        except Exception as e:
+            print(f"[warn] 导出登录状态失败: {e}")
+    await context.close()
+    if browser is not None:
+        await browser.close()
+
+
+class PagePool:
+    """详情页复用池：页面通过 goto 复用，避免每个帖子重新创建渲染进程。
+
+    页面导航次数达到 max_uses 或 JS 堆内存超过 max_heap_mb 时关闭并在下次取用时新建，
+    保证长时间运行时浏览器内存有上限；0 表示不按该条件回收。
+    """
+
+    def __init__(self, context, timeout_ms: int = 30000, max_uses: int = DEFAULT_PAGE_MAX_USES, max_heap_mb: int = DEFAULT_PAGE_MAX_HEAP_MB):
+        self.context = context
+        self.timeout_ms = timeout_ms
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.recycled = 0
+        self._idle: list = []
+        self._uses: dict = {}
+
+    async def acquire(self):
+        """取出一个空闲页面，没有时新建（只在新建时设置超时）。"""
+        while self._idle:
+            page = self._idle.pop()
+            if not page.is_closed():
+                return page
+            self._uses.pop(page, None)
+        page = await self.context.new_page()
+        page.set_default_navigation_timeout(self.timeout_ms)
+        page.set_default_timeout(self.timeout_ms)
+        self._uses[page] = 0
+        return page
+
+    async def heap_mb(self, page) -> float:
+        """读取页面 JS 堆占用（MB），不支持时返回 0。"""
+        used = await safe_eval(page, '() => (performance.memory && performance.memory.usedJSHeapSize) || 0')
+        return (used or 0) / (1024 * 1024)
+
+    async def release(self, page, reusable: bool = True):
+        """归还页面；出错的页面或达到回收条件的页面直接关闭。"""
+        uses = self._uses.pop(page, 0) + 1
+        if page.is_closed():
+            return
+        if reusable and self.max_uses and uses >= self.max_uses:
+            reusable = False
+        if reusable and self.max_heap_mb and await self.heap_mb(page) >= self.max_heap_mb:
+            reusable = False
+        if not reusable:
+            self.recycled += 1
+            try:
+                await page.close()
+            except Exception:
+                pass
+            return
+        self._uses[page] = uses
+        self._idle.append(page)
+
+    async def close(self):
+        """关闭所有空闲页面。"""
+        pages, self._idle = self._idle, []
+        for page in pages:
+            self._uses.pop(page, None)
+            try:
+                await page.close()
+            except Exception:
+                pass
+        if self.recycled:
+            print(f"[info] 详情页回收重建: {self.recycled} 次")
+
+
+def new_page_pool(context, timeout_ms: int = 30000, page_recycle: dict | None = None) -> PagePool:
+    """按 page_recycle（{'max_uses', 'max_heap_mb'}）创建详情页复用池。"""
+    return PagePool(context, timeout_ms, **(page_recycle or {}))
+
+
+async def fetch_note(pages: PagePool, url: str, idx: int, total: int | str, timeout_ms: int = 30000, capture_images: bool = False) -> dict:
+    """打开单个帖子详情页并提取内容，提取完成后立即归还页面。
+
+    Returns:
+        帖子数据（图片尚未下载）
+    """
+    print(f"[info] [{idx}/{total}] 打开帖子: {url}")
+    detail = await pages.acquire()
+    responses: dict = {}
+
+    def on_response(response):
+        remember_image_response(responses, response)
+
+    if capture_images:
+        detail.on('response', on_response)
+    reusable = False
+    try:
+        try:
+            await detail.goto(url, wait_until='domcontentloaded')
+        except PlaywrightTimeoutError:
+            print(f"[warn] 打开帖子超时: {url}")
+        # 正文与轮播图片地址就绪后立即提取，不再固定等待 load/networkidle
+        if not await wait_for_note_ready(detail, min(timeout_ms, DEFAULT_READY_TIMEOUT_MS)):
+            print(f"[warn] 等待帖子内容就绪超时，继续提取: {url}")
+        try:
+            data = await extract_post_content(detail, url)
+        except Exception as e:
+            print(f"[warn] 提取帖子内容失败: {e}")
+            data = {
+                'url': url,
+                'note_id': None,
+                'title': '提取失败',
+                'description': '',
+                'content_text': '',
+                'images': [],
+                'videos': [],
+                'swiper_images': [],
+                'downloaded_images': [],
+            }
+        if responses and data.get('swiper_images'):
+            # 页面关闭前读取已加载图片的响应体
+            data['captured_images'] = await collect_captured_images(responses, data['swiper_images'], data.get('image_fallbacks'))
+        reusable = True
+    finally:
+        # 移除本帖子的监听器后归还页面，下一个帖子直接在该页面上导航
+        if capture_images:
+            detail.remove_listener('response', on_response)
+        await pages.release(detail, reusable)
+    return data
+
+
+async def save_post(data: dict, idx: int, out: str, out_format: str = 'html', block_policy: dict | None = None, downloader: ImageDownloader | None = None, journal: CrawlJournal | None = None) -> dict:
+    """下载帖子的轮播图片并渲染保存为 HTML/Markdown 文件，各阶段完成后写入任务日志。
+
+    Returns:
+        索引条目 {'file', 'title', 'url', 'note_id'}
+    """
+    url = data.get('url', '')
+    # 页面关闭后再下载轮播图片，下载在线程中进行，不阻塞其他帖子的浏览器操作；从任务日志恢复且图片齐全的帖子不再重新下载
+    swiper_imgs = data.get('swiper_images') if (not block_policy or block_policy['download_images']) else []
+    if swiper_imgs and not data.get('downloaded_images'):
+        try:
+            local_files = await asyncio.to_thread(download_images, swiper_imgs, Path(out) / 'images', (data.get('note_id') or f'post-{idx}'), url, None, data.get('image_fallbacks'), data.pop('captured_images', None), downloader)
+            data['downloaded_images'] = [f"images/{Path(p).name}" for p in local_files]
+            if journal:
+                journal.mark(url, 'images', images=data['downloaded_images'])
+        except Exception as e:
+            print(f"[warn] 下载轮播图片失败: {e}")
+    fname_base = data.get('note_id') or f"post-{idx}"
+    safe_title = re.sub(r'[\\/:*?\"<>|]+', '_', data.get('title') or '')
+    ext = 'html' if out_format == 'html' else 'md'
+    filename = f"{fname_base}_{safe_title[:50]}.{ext}" if safe_title else f"{fname_base}.{ext}"
+    content = render_post_html(data) if out_format == 'html' else render_post_markdown(data)
+    # 先打开帖子目录，首次在旧版输出目录中导入已有帖子时不会包含本次保存的文件
+    catalog = open_catalog(out)
+    file_path = save_document(content, out, filename, skip_if_exists=False)
+    entry = {'file': os.path.basename(file_path), 'title': data.get('title'), 'url': url, 'note_id': data.get('note_id')}
+    catalog_entry = dict(entry, note_id=entry['note_id'] or extract_note_id_from_url(url) or fname_base)
+    previous = catalog.get(catalog_entry['note_id'], out_format)
+    if previous and previous['file'] != entry['file']:
+        # 标题变化导致文件名改变时，旧文件不再出现在检索结果中
+        open_search_index(out).remove(previous['file'])
+    catalog.upsert(catalog_entry, out_format, data.get('downloaded_images'), hashlib.sha256(content.encode('utf-8')).hexdigest(), data.get('content_text'))
+    if journal:
+        journal.mark(url, 'rendered', entry)
+    return entry
+
+
+class SaveStage:
+    """后台保存阶段：详情页提取完成后把帖子交给本阶段下载图片并保存，页面协程立即处理下一个帖子。
+
+    待保存的帖子最多 max_pending 个，队列满时 submit 等待，保证内存占用有上限。
+    """
+
+    def __init__(self, out: str, out_format: str = 'html', block_policy: dict | None = None, downloader: ImageDownloader | None = None, workers: int = 1, max_pending: int = 2, journal: CrawlJournal | None = None):
+        self.out = out
+        self.journal = journal
+        self.out_format = out_format
+        self.block_policy = block_policy
+        self.downloader = downloader
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_pending))
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(max(1, workers))]
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            data, idx, on_saved = item
+            entry = None
+            try:
+                entry = await save_post(data, idx, self.out, self.out_format, self.block_policy, self.downloader, self.journal)
             except Exception as e:
-                print(f"[warn] 添加 cookies 失败: {e}")
-        page = context.new_page()
-        page.set_default_navigation_timeout(timeout_ms)
-        page.set_default_timeout(timeout_ms)
+                print(f"[warn] 保存帖子失败: {data.get('url')} {e}")
+                if self.journal:
+                    self.journal.mark(data.get('url', ''), 'failed')
+            on_saved(entry)
+
+    async def submit(self, data: dict, idx: int, on_saved):
+        """提交一个待保存的帖子，on_saved(entry) 在保存完成后调用（失败时 entry 为 None）。"""
+        await self.queue.put((data, idx, on_saved))
+
+    async def close(self):
+        """等待所有已提交的帖子保存完成。"""
+        for _ in self.tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self.tasks)
+
+
+async def crawl_links(links: list[str], out: str, context, timeout_ms: int = 30000, out_format: str = 'html', concurrency: int = 1, positions: list[int] | None = None, total: int | None = None, block_policy: dict | None = None, capture_images: bool = False, page_recycle: dict | None = None, on_done=None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, journal: CrawlJournal | None = None) -> list[dict]:
+    """处理帖子链接列表，返回按输入顺序排列的索引条目。
+
+    启动 concurrency 个协程在同一浏览器上下文中并发打开详情页，通过有界队列分发任务，详情页由复用池提供；
+    图片下载与保存交给后台 SaveStage，与后续页面导航重叠进行。
+    positions/total 用于分片模式下显示和命名时沿用全局序号；on_done(url, entry) 在每个帖子处理完成后调用，失败时 entry 为 None。
+    """
+    if not links:
+        return []
+    positions = positions or list(range(1, len(links) + 1))
+    total = total or len(links)
+    workers_count = max(1, min(concurrency, len(links)))
+    if workers_count > 1:
+        print(f"[info] 并发处理帖子: {workers_count} 个详情页")
+    tasks: asyncio.Queue = asyncio.Queue(maxsize=workers_count * 2)
+    results: list[dict | None] = [None] * len(links)
+    pages = new_page_pool(context, timeout_ms, page_recycle)
+    downloader = ImageDownloader(per_host=image_concurrency, store_images=image_store)
+    stage = SaveStage(out, out_format, block_policy, downloader, workers=workers_count, max_pending=workers_count * 2, journal=journal)
+
+    def saved(slot: int, url: str):
+        def on_saved(entry: dict | None):
+            results[slot] = entry
+            if on_done:
+                on_done(url, entry)
+        return on_saved
+
+    async def worker():
+        while True:
+            task = await tasks.get()
+            if task is None:
+                return
+            slot, url = task
+            try:
+                data = await fetch_note(pages, url, positions[slot], total, timeout_ms, capture_images)
+            except Exception as e:
+                print(f"[warn] 处理帖子失败: {url} {e}")
+                if journal:
+                    journal.mark(url, 'failed')
+                if on_done:
+                    on_done(url, None)
+                continue
+            if journal:
+                journal.fetched(url, data)
+            await stage.submit(data, positions[slot], saved(slot, url))
+
+    workers = [asyncio.create_task(worker()) for _ in range(workers_count)]
+    for slot, url in enumerate(links):
+        await tasks.put((slot, url))
+    for _ in workers:
+        await tasks.put(None)
+    await asyncio.gather(*workers)
+    await stage.close()
+    await pages.close()
+    downloader.close()
+    return [r for r in results if r is not None]
+
+
+async def _crawl_shard_async(links: list[str], positions: list[int], total: int, out: str, cookies: list[dict], headless: bool, timeout_ms: int, user_agent: str | None, out_format: str, concurrency: int, block_policy: dict | None, capture_images: bool, page_recycle: dict | None, storage_state: str | None, asset_cache: dict | None, image_concurrency: int, image_store: bool, journal_path: str | None) -> list[dict]:
+    async with async_playwright() as pw:
+        # 持久化目录不能被多个浏览器进程同时打开，分片进程使用其导出的登录状态
+        browser, context = await new_browser_context(pw, headless=headless, user_agent=user_agent, cookies=cookies, block_policy=block_policy, storage_state=storage_state, asset_cache=asset_cache)
+        try:
+            return await crawl_links(links, out, context, timeout_ms=timeout_ms, out_format=out_format, concurrency=concurrency, positions=positions, total=total, block_policy=block_policy, capture_images=capture_images, page_recycle=page_recycle, image_concurrency=image_concurrency, image_store=image_store, journal=CrawlJournal(journal_path) if journal_path else None)
+        finally:
+            await close_browser_context(browser, context)
+
+
+def _crawl_shard(*args) -> list[dict]:
+    """分片进程入口：在独立进程中启动浏览器处理一组链接。"""
+    return asyncio.run(_crawl_shard_async(*args))
+
+
+async def crawl_links_sharded(links: list[str], out: str, workers: int, cookies: list[dict] | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', concurrency: int = 1, block_policy: dict | None = None, capture_images: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, journal: CrawlJournal | None = None) -> list[dict]:
+    """将链接轮询切分为 workers 个分片，每个分片在独立进程和浏览器中处理。
+
+    Returns:
+        合并后按输入顺序排列的索引条目
+    """
+    workers = max(1, min(workers, len(links)))
+    total = len(links)
+    shards = [(links[i::workers], list(range(i + 1, total + 1, workers))) for i in range(workers)]
+    print(f"[info] 多进程分片处理: {workers} 个进程，每进程并发 {concurrency} 个详情页")
+    storage_state = str(profile_state_path(profile_dir)) if profile_dir and profile_state_path(profile_dir).exists() else None
+    loop = asyncio.get_running_loop()
+    results: list[dict] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            loop.run_in_executor(pool, _crawl_shard, shard_links, shard_positions, total, out, cookies or [], headless, timeout_ms, user_agent, out_format, concurrency, block_policy, capture_images, page_recycle, storage_state, asset_cache, image_concurrency, image_store, str(journal.path) if journal else None)
+            for shard_links, shard_positions in shards
+        ]
+        for shard_result in await asyncio.gather(*futures, return_exceptions=True):
+            if isinstance(shard_result, BaseException):
+                print(f"[warn] 分片进程失败: {shard_result}")
+                continue
+            results.extend(shard_result)
+    order = {url: i for i, url in enumerate(links)}
+    results.sort(key=lambda item: order.get(item['url'], total))
+    return results
+
+
+def new_http_session(cookies: list[dict] | None = None, user_agent: str | None = None, pool_size: int = 10) -> requests.Session:
+    """创建带连接池与登录 cookies 的 requests.Session。"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': user_agent or DEFAULT_USER_AGENT,
+        'Referer': 'https://www.xiaohongshu.com/',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9',
+    })
+    for c in cookies or []:
+        session.cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path') or '/')
+    return session
+
+
+def parse_initial_state(text: str) -> dict | None:
+    """从 SSR HTML 中解析 window.__INITIAL_STATE__（JS 对象字面量，含 undefined）。"""
+    m = re.search(r'window\.__INITIAL_STATE__\s*=\s*', text or '')
+    if not m:
+        return None
+    end = text.find('</script>', m.end())
+    raw = text[m.end():end if end >= 0 else len(text)].strip().rstrip(';')
+    raw = re.sub(r'(?<=[:\[,])\s*undefined\s*(?=[,}\]])', 'null', raw)
+    try:
+        state = json.loads(raw)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def note_from_initial_state(state: dict, note_id: str | None = None) -> dict | None:
+    """从初始状态中取出指定（或当前）帖子的 note 对象。"""
+    note_state = (state or {}).get('note') or {}
+    detail_map = note_state.get('noteDetailMap') or {}
+    note_id = note_id or note_state.get('currentNoteId') or note_state.get('firstNoteId')
+    entry = detail_map.get(note_id) if note_id else None
+    if not entry:
+        entry = next((e for e in detail_map.values() if isinstance(e, dict) and (e.get('note') or {}).get('noteId')), None)
+    return (entry or {}).get('note')
+
+
+def fetch_note_http(session: requests.Session, url: str, timeout: float = 30) -> dict | None:
+    """不启动浏览器，直接请求帖子页面并解析 SSR 内嵌状态。
+
+    Returns:
+        帖子数据；请求失败或无法解析时返回 None（交由浏览器处理）
+    """
+    try:
+        resp = session.get(url, timeout=timeout)
+    except Exception as e:
+        print(f"[warn] HTTP 请求失败: {url} {e}")
+        return None
+    if resp.status_code != 200:
+        return None
+    resp.encoding = 'utf-8'
+    state = parse_initial_state(resp.text)
+    record = note_record_from_state(note_from_initial_state(state, extract_note_id_from_url(url))) if state else None
+    if not record:
+        return None
+    if not record['title']:
+        m = re.search(r'<meta[^>]+(?:property|name)="og:title"[^>]+content="([^"]*)"', resp.text)
+        record['title'] = html_unescape(m.group(1)) if m else ''
+    return post_data_from_record(url, record)
+
+
+async def crawl_links_http(links: list[str], out: str, cookies: list[dict] | None = None, user_agent: str | None = None, timeout_ms: int = 30000, out_format: str = 'html', concurrency: int = 1, block_policy: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, journal: CrawlJournal | None = None) -> tuple[list[dict], list[str]]:
+    """使用 HTTP 直接抓取帖子，最多 concurrency 个请求同时进行。
+
+    Returns:
+        (成功保存的索引条目, 解析失败需交由浏览器处理的链接)
+    """
+    if not links:
+        return [], []
+    concurrency = max(1, concurrency)
+    session = new_http_session(cookies, user_agent, pool_size=max(concurrency, 4))
+    semaphore = asyncio.Semaphore(concurrency)
+    downloader = ImageDownloader(user_agent=user_agent, per_host=image_concurrency, store_images=image_store)
+    total = len(links)
+
+    async def fetch_one(idx: int, url: str):
+        async with semaphore:
+            data = await asyncio.to_thread(fetch_note_http, session, url, timeout_ms / 1000)
+            if not data:
+                return None
+            print(f"[info] [{idx}/{total}] HTTP 解析帖子: {url}")
+            if journal:
+                journal.fetched(url, data)
+            return await save_post(data, idx, out, out_format, block_policy, downloader, journal)
+
+    print(f"[info] HTTP 模式抓取 {total} 个帖子，并发 {concurrency}")
+    try:
+        entries = await asyncio.gather(*(fetch_one(idx, url) for idx, url in enumerate(links, start=1)), return_exceptions=True)
+    finally:
+        session.close()
+        downloader.close()
+    results = []
+    failed = []
+    for url, entry in zip(links, entries):
+        if isinstance(entry, dict):
+            results.append(entry)
+        else:
+            if isinstance(entry, BaseException):
+                print(f"[warn] HTTP 处理帖子失败: {url} {entry}")
+            failed.append(url)
+    if failed:
+        print(f"[info] {len(failed)} 个帖子无法通过 HTTP 解析，改用浏览器处理")
+    return results, failed
+
+
+async def crawl_details(pw, links: list[str], out: str, browser=None, context=None, cookies: list[dict] | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', concurrency: int = 1, workers: int = 1, block_policy: dict | None = None, fetch_mode: str = 'browser', capture_images: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, journal: CrawlJournal | None = None) -> list[dict]:
+    """详情抓取阶段：按 fetch_mode 先走 HTTP，再由浏览器（单进程或多进程分片）处理剩余链接。
+
+    传入的 browser/context 会在本函数内关闭；未传入且需要浏览器时按需启动。
+    使用持久化浏览器目录且未提供 cookies 时，HTTP 与分片进程沿用目录中导出的登录状态。
+
+    Returns:
+        按输入顺序排列的索引条目
+    """
+    order = {url: i for i, url in enumerate(links)}
+    results: list[dict] = []
+    remaining = links
+    if fetch_mode == 'http':
+        http_cookies = cookies or (await context.cookies() if context is not None and profile_dir else load_profile_cookies(profile_dir))
+        results, remaining = await crawl_links_http(links, out, cookies=http_cookies, user_agent=user_agent, timeout_ms=timeout_ms, out_format=out_format, concurrency=concurrency, block_policy=block_policy, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+    if remaining and workers > 1 and len(remaining) > 1:
+        # 分片进程各自启动浏览器，主进程的浏览器先行释放
+        if context is not None:
+            await close_browser_context(browser, context, profile_dir)
+            browser = context = None
+        results += await crawl_links_sharded(remaining, out, workers, cookies=cookies, headless=headless, timeout_ms=timeout_ms, user_agent=user_agent, out_format=out_format, concurrency=concurrency, block_policy=block_policy, capture_images=capture_images, page_recycle=page_recycle, profile_dir=profile_dir, asset_cache=asset_cache, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+    elif remaining:
+        if context is None:
+            browser, context = await new_browser_context(pw, headless=headless, user_agent=user_agent, cookies=cookies, block_policy=block_policy, profile_dir=profile_dir, asset_cache=asset_cache)
+        results += await crawl_links(remaining, out, context, timeout_ms=timeout_ms, out_format=out_format, concurrency=concurrency, block_policy=block_policy, capture_images=capture_images, page_recycle=page_recycle, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+    if context is not None:
+        await close_browser_context(browser, context, profile_dir)
+    results.sort(key=lambda item: order.get(item['url'], len(links)))
+    return results
+
+
+async def crawl_link_stream(link_queue: asyncio.Queue, out: str, context, timeout_ms: int = 30000, out_format: str = 'html', concurrency: int = 1, existing_ids: set[str] | None = None, skip_existing: bool = False, block_policy: dict | None = None, fetch_mode: str = 'browser', cookies: list[dict] | None = None, user_agent: str | None = None, capture_images: bool = False, page_recycle: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, journal: CrawlJournal | None = None) -> list[dict]:
+    """流式详情抓取：逐个取出滚动阶段新发现的链接并立即处理，取到 None 时结束。
+
+    去重与跳过已下载在每个链接到达时进行；http 模式下先尝试 HTTP，失败再用浏览器。
+
+    Returns:
+        按发现顺序排列的索引条目
+    """
+    concurrency = max(1, concurrency)
+    session = new_http_session(cookies, user_agent, pool_size=max(concurrency, 4)) if fetch_mode == 'http' else None
+    tasks: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    results: list[tuple[int, dict]] = []
+    pages = new_page_pool(context, timeout_ms, page_recycle)
+    downloader = ImageDownloader(user_agent=user_agent, per_host=image_concurrency, store_images=image_store)
+    stage = SaveStage(out, out_format, block_policy, downloader, workers=concurrency, max_pending=concurrency * 2, journal=journal)
+    seen_ids: set[str] = set()
+
+    def saved(slot: int):
+        def on_saved(entry: dict | None):
+            if entry:
+                results.append((slot, entry))
+        return on_saved
+
+    dup_count = skip_count = 0
+
+    async def worker():
+        while True:
+            task = await tasks.get()
+            if task is None:
+                return
+            slot, url = task
+            try:
+                data = None
+                if session is not None:
+                    data = await asyncio.to_thread(fetch_note_http, session, url, timeout_ms / 1000)
+                    if data:
+                        print(f"[info] [{slot + 1}/?] HTTP 解析帖子: {url}")
+                if data is None:
+                    data = await fetch_note(pages, url, slot + 1, '?', timeout_ms, capture_images)
+            except Exception as e:
+                print(f"[warn] 处理帖子失败: {url} {e}")
+                if journal:
+                    journal.mark(url, 'failed')
+                continue
+            if journal:
+                journal.fetched(url, data)
+            await stage.submit(data, slot + 1, saved(slot))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    slot = 0
+    try:
+        while True:
+            url = await link_queue.get()
+            if url is None:
+                break
+            note_id = extract_note_id_from_url(url)
+            if not note_id or note_id in seen_ids:
+                dup_count += 1
+                continue
+            seen_ids.add(note_id)
+            if skip_existing and existing_ids and note_id in existing_ids:
+                skip_count += 1
+                continue
+            if journal:
+                journal.mark(url, 'queued')
+            await tasks.put((slot, url))
+            slot += 1
+    finally:
+        for _ in workers:
+            await tasks.put(None)
+        await asyncio.gather(*workers)
+        await stage.close()
+        await pages.close()
+        downloader.close()
+        if session is not None:
+            session.close()
+    if dup_count > 0:
+        print(f"[info] 去除重复链接: {dup_count} 个")
+    if skip_count > 0:
+        print(f"[info] 跳过已存在的帖子: {skip_count} 个")
+    results.sort(key=lambda item: item[0])
+    return [entry for _, entry in results]
+
+
+async def collect_profile_links(context, user: str, timeout_ms: int = 30000, limit: int | None = None, profile_source: str = 'feed', known_ids: set[str] | None = None, stop_after_known: int = 0, on_links=None) -> tuple[list[str], dict[str, dict]]:
+    """打开用户主页并滚动收集帖子链接，完成后关闭主页页面。
+
+    Returns:
+        (按主页顺序排列的帖子链接, 帖子列表接口已提供标题的 {url: {'title', 'note_id'}})
+    """
+    profile_url = build_profile_url(user)
+    print(f"[info] 打开用户主页: {profile_url}")
+    page = await context.new_page()
+    page.set_default_navigation_timeout(timeout_ms)
+    page.set_default_timeout(timeout_ms)
+    feed = install_feed_capture(page) if profile_source == 'feed' else None
+    try:
         try:
-            page.goto(profile_url, wait_until='domcontentloaded')
+            await page.goto(profile_url, wait_until='domcontentloaded')
         except PlaywrightTimeoutError:
             print("[warn] 主页加载超时，继续尝试滚动采集。")
-        # 初始短等待以加载首屏
-        page.wait_for_timeout(2000)
+        # 等待首屏帖子出现，最多等待 DEFAULT_READY_TIMEOUT_MS
+        try:
+            await page.wait_for_selector(POST_LINK_SELECTOR, state='attached', timeout=DEFAULT_READY_TIMEOUT_MS)
+        except Exception:
+            print("[warn] 首屏帖子未在预期时间内出现，继续尝试滚动采集。")
         print("[info] 开始滚动加载帖子列表...")
-        links = scroll_to_load_all(page, limit=limit)
-        print(f"[info] 收集到帖子链接: {len(links)}")
-        
-        # 获取已存在的 note_id 并去重、过滤链接
+        links = []
+        known_titles = {}
+        if feed is not None:
+            feed_notes = await harvest_profile_feed(page, feed, limit=limit, known_ids=known_ids, stop_after_known=stop_after_known, on_links=on_links)
+            links = [n['url'] for n in feed_notes]
+            known_titles = {n['url']: {'title': n['title'], 'note_id': n['note_id']} for n in feed_notes if n['title']}
+            if not links:
+                print("[warn] 未捕获到帖子列表接口数据，改为从页面链接采集。")
+        if not links:
+            links = await scroll_to_load_all(page, limit=limit, known_ids=known_ids, stop_after_known=stop_after_known, on_links=on_links)
+    finally:
+        await page.close()
+    print(f"[info] 收集到帖子链接: {len(links)}")
+    return links, known_titles
+
+
+def build_indexes(out: str, out_format: str = 'html') -> str:
+    """由帖子目录更新 HTML 索引（markdown 格式时另更新 index.md），只收录 out_format 格式的帖子文件，返回索引路径描述。"""
+    index_html = build_index_html(out, 'html' if out_format == 'html' else 'markdown')
+    index_md = build_index_markdown(out) if out_format == 'markdown' else None
+    return f"{index_html}{' / ' + index_md if index_md else ''}"
+
+
+def journal_path(out: str | Path) -> Path:
+    """输出目录中的任务日志路径。"""
+    return Path(out) / '.tmp' / 'journal.jsonl'
+
+
+def load_resume_state(journal: CrawlJournal, source: str, target: str) -> dict | None:
+    """读取可恢复的任务日志，日志不存在或属于其他任务时返回 None。"""
+    state = journal.load()
+    if state is None:
+        print("[info] 没有可恢复的任务日志，重新开始")
+        return None
+    if state['source'] != source or state['target'] != target:
+        print(f"[warn] 任务日志属于其他任务（{state['source']}: {state['target']}），重新开始")
+        return None
+    print(f"[info] 从任务日志恢复：已完成 {len(state['entries'])} 个，已提取待保存 {len(CrawlJournal.fetched_posts(state))} 个，待抓取 {len(CrawlJournal.pending_links(state))} 个")
+    return state
+
+
+async def save_fetched_posts(state: dict, out: str, out_format: str = 'html', block_policy: dict | None = None, concurrency: int = 1, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, journal: CrawlJournal | None = None) -> list[dict]:
+    """恢复任务时保存日志中已提取但未保存的帖子，不再打开详情页；本地图片齐全的帖子跳过下载。
+
+    Returns:
+        成功保存的索引条目
+    """
+    posts = CrawlJournal.fetched_posts(state)
+    if not posts:
+        return []
+    order = {url: i for i, url in enumerate(state['links'], start=1)}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    downloader = ImageDownloader(per_host=image_concurrency, store_images=image_store)
+
+    async def save_one(data: dict):
+        images = data.get('downloaded_images') or []
+        if images and not all((Path(out) / name).exists() for name in images):
+            data['downloaded_images'] = []
+        async with semaphore:
+            try:
+                return await save_post(data, order.get(data['url'], 0), out, out_format, block_policy, downloader, journal)
+            except Exception as e:
+                print(f"[warn] 保存帖子失败: {data['url']} {e}")
+                if journal:
+                    journal.mark(data['url'], 'failed')
+                return None
+
+    print(f"[info] 保存任务日志中已提取的 {len(posts)} 个帖子")
+    try:
+        entries = await asyncio.gather(*(save_one(data) for data in posts))
+    finally:
+        downloader.close()
+    return [entry for entry in entries if entry is not None]
+
+
+def merge_resumed_results(state: dict, results: list[dict]) -> list[dict]:
+    """合并日志中已完成的条目与本次结果，按原任务顺序排列。"""
+    order = {url: i for i, url in enumerate(state['links'])}
+    merged = {entry['url']: entry for entry in CrawlJournal.completed_entries(state)}
+    merged.update({entry['url']: entry for entry in results})
+    return sorted(merged.values(), key=lambda entry: order.get(entry['url'], len(order)))
+
+
+async def run_async(user: str, out: str, cookies_path: str | None = None, limit: int | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, note_keyword: str | None = None, keyword_only: bool = False, concurrency: int = 1, workers: int = 1, block_policy: dict | None = None, fetch_mode: str = 'browser', capture_images: bool = False, profile_source: str = 'feed', stop_after_known: int = 0, stream: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, resume: bool = False):
+    async with async_playwright() as pw:
+        cookies = load_cookies(cookies_path)
+        browser, context = await new_browser_context(pw, headless=headless, user_agent=user_agent, cookies=cookies, block_policy=block_policy, profile_dir=profile_dir, asset_cache=asset_cache)
+        journal = CrawlJournal(str(journal_path(out)))
+        state = load_resume_state(journal, 'user', user) if resume else None
+        if state is not None:
+            # 直接处理日志中未完成的帖子，不再滚动主页；已提取的帖子直接保存
+            saved = await save_fetched_posts(state, out, out_format, block_policy, concurrency=concurrency, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+            results = saved + await crawl_details(pw, CrawlJournal.pending_links(state), out, browser=browser, context=context, cookies=cookies, headless=headless, timeout_ms=timeout_ms, user_agent=user_agent, out_format=out_format, concurrency=concurrency, workers=workers, block_policy=block_policy, fetch_mode=fetch_mode, capture_images=capture_images, page_recycle=page_recycle, profile_dir=profile_dir, asset_cache=asset_cache, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+            results = merge_resumed_results(state, results)
+            journal.finish_run()
+            print(f"[done] 已保存 {len(results)} 个帖子。索引: {build_indexes(out, out_format)}")
+            return
+        journal.start_run('user', user)
+        # 增量模式下在滚动时即比对已下载的 note_id
         existing_ids = get_existing_note_ids(out, out_format) if skip_existing else set()
+        # 流式模式：滚动发现的链接立即交给详情协程处理（关键词优先排序与多进程分片需要完整列表，此时不启用）
+        stream = stream and not note_keyword and workers <= 1
+        link_queue: asyncio.Queue | None = asyncio.Queue() if stream else None
+        stream_task = None
+        if stream:
+            print("[info] 流式模式：边滚动边抓取帖子详情")
+            stream_task = asyncio.create_task(crawl_link_stream(link_queue, out, context, timeout_ms=timeout_ms, out_format=out_format, concurrency=concurrency, existing_ids=existing_ids, skip_existing=skip_existing, block_policy=block_policy, fetch_mode=fetch_mode, cookies=cookies, user_agent=user_agent, capture_images=capture_images, page_recycle=page_recycle, image_concurrency=image_concurrency, image_store=image_store, journal=journal))
+
+        def on_links(urls: list[str]):
+            for url in urls:
+                link_queue.put_nowait(url)
+
+        try:
+            links, known_titles = await collect_profile_links(context, user, timeout_ms=timeout_ms, limit=limit, profile_source=profile_source, known_ids=existing_ids, stop_after_known=stop_after_known, on_links=on_links if stream else None)
+        finally:
+            if stream_task is not None:
+                link_queue.put_nowait(None)
+        if stream_task is not None:
+            results = await stream_task
+            await close_browser_context(browser, context, profile_dir)
+            journal.finish_run()
+            print(f"[done] 已保存 {len(results)} 个帖子。索引: {build_indexes(out, out_format)}")
+            return
+        
+        # 去重并过滤已存在的链接
         links, dup_count, skip_count = deduplicate_and_filter_links(links, existing_ids, skip_existing)
         
         if dup_count > 0:
@@ -774,9 +2577,12 @@ def run(user: str, out: str, cookies_path: str | None = None, limit: int | None
             print(f"[info] 跳过已存在的帖子: {skip_count} 个")
         print(f"[info] 待处理帖子: {len(links)} 个")
         
-        # 如果指定了关键词，获取标题并筛选
+        # 如果指定了关键词，获取标题并筛选（帖子列表接口已提供标题的无需再打开页面）
         if note_keyword:
-            notes_info = cache_note_info(links, out, context, timeout_ms)
+            notes_info = {url: known_titles[url] for url in links if url in known_titles}
+            missing = [url for url in links if url not in notes_info]
+            if missing:
+                notes_info.update(await cache_note_info(missing, out, context, timeout_ms, page_recycle))
             keyword_links, other_links = filter_links_by_keyword(links, notes_info, note_keyword, keyword_only)
             
             if keyword_only:
@@ -786,65 +2592,16 @@ def run(user: str, out: str, cookies_path: str | None = None, limit: int | None
                 links = keyword_links + other_links
                 print(f"[info] 优先下载 {len(keyword_links)} 个关键词匹配帖子，然后下载 {len(other_links)} 个其他帖子")
         
-        results = []
-        for idx, url in enumerate(links, start=1):
-            print(f"[info] [{idx}/{len(links)}] 打开帖子: {url}")
-            detail = context.new_page()
-            detail.set_default_navigation_timeout(timeout_ms)
-            detail.set_default_timeout(timeout_ms)
-            try:
-                detail.goto(url, wait_until='domcontentloaded')
-                # 尝试在 SPA 环境下等待更稳定的状态
-                try:
-                    detail.wait_for_load_state('load')
-                except Exception:
-                    pass
-                try:
-                    detail.wait_for_load_state('networkidle', timeout=2000)
-                except Exception:
-                    pass
-            except PlaywrightTimeoutError:
-                print(f"[warn] 打开帖子超时: {url}")
-            # 等待图片懒加载一些
-            detail.wait_for_timeout(1200)
-            try:
-                data = extract_post_content(detail, url)
-            except Exception as e:
-                print(f"[warn] 提取帖子内容失败: {e}")
-                data = {
-                    'url': url,
-                    'note_id': None,
-                    'title': '提取失败',
-                    'description': '',
-                    'content_text': '',
-                    'images': [],
-                    'videos': [],
-                    'downloaded_images': [],
-                }
-            # 提取并下载轮播图片
-            try:
-                swiper_imgs = extract_swiper_images(detail)
-                if swiper_imgs:
-                    local_files = download_images(swiper_imgs, Path(out) / 'images', prefix=(data.get('note_id') or f'post-{idx}'), referer=url)
-                    data['downloaded_images'] = [f"images/{Path(p).name}" for p in local_files]
-            except Exception as e:
-                print(f"[warn] 下载轮播图片失败: {e}")
-            fname_base = data.get('note_id') or f"post-{idx}"
-            safe_title = re.sub(r'[\\/:*?\"<>|]+', '_', data.get('title') or '')
-            ext = 'html' if out_format == 'html' else 'md'
-            filename = f"{fname_base}_{safe_title[:50]}.{ext}" if safe_title else f"{fname_base}.{ext}"
-            if out_format == 'html':
-                file_path = save_document(render_post_html(data), out, filename, skip_if_exists=False)
-            else:
-                file_path = save_document(render_post_markdown(data), out, filename, skip_if_exists=False)
-            results.append({'file': os.path.basename(file_path), 'title': data.get('title'), 'url': url, 'note_id': data.get('note_id')})
-            detail.close()
-        # 合并已存在的索引，因为我们已经在处理前过滤了已存在的帖子
-        index_html = build_index_html(results, out, merge_existing=skip_existing)
-        index_md = build_index_markdown(results, out, merge_existing=skip_existing) if out_format == 'markdown' else None
-        print(f"[done] 已保存 {len(results)} 个帖子。索引: {index_html}{' / ' + index_md if index_md else ''}")
-        context.close()
-        browser.close()
+        journal.queued(links)
+        results = await crawl_details(pw, links, out, browser=browser, context=context, cookies=cookies, headless=headless, timeout_ms=timeout_ms, user_agent=user_agent, out_format=out_format, concurrency=concurrency, workers=workers, block_policy=block_policy, fetch_mode=fetch_mode, capture_images=capture_images, page_recycle=page_recycle, profile_dir=profile_dir, asset_cache=asset_cache, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+        # 索引由帖子目录生成，始终包含此前保存的全部帖子
+        journal.finish_run()
+        print(f"[done] 已保存 {len(results)} 个帖子。索引: {build_indexes(out, out_format)}")
+
+
+def run(user: str, out: str, cookies_path: str | None = None, limit: int | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, note_keyword: str | None = None, keyword_only: bool = False, concurrency: int = 1, workers: int = 1, block_policy: dict | None = None, fetch_mode: str = 'browser', capture_images: bool = False, profile_source: str = 'feed', stop_after_known: int = 0, stream: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, resume: bool = False):
+    """同步入口：在事件循环中运行 run_async，参数同 run_async。"""
+    asyncio.run(run_async(user, out, cookies_path=cookies_path, limit=limit, headless=headless, timeout_ms=timeout_ms, user_agent=user_agent, out_format=out_format, skip_existing=skip_existing, note_keyword=note_keyword, keyword_only=keyword_only, concurrency=concurrency, workers=workers, block_policy=block_policy, fetch_mode=fetch_mode, capture_images=capture_images, profile_source=profile_source, stop_after_known=stop_after_known, stream=stream, page_recycle=page_recycle, profile_dir=profile_dir, asset_cache=asset_cache, image_concurrency=image_concurrency, image_store=image_store, resume=resume))
 
 
 def load_links_from_csv(csv_path: str) -> list[str]:
@@ -890,51 +2647,50 @@ def load_links_from_csv(csv_path: str) -> list[str]:
         return []
 
 
-def run_from_csv(csv_path: str, out: str, cookies_path: str | None = None, limit: int | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, note_keyword: str | None = None, keyword_only: bool = False):
-    links = load_links_from_csv(csv_path)
-    if not links:
-        print(f"[warn] CSV 未读取到有效链接: {csv_path}")
-        return
+async def run_from_csv_async(csv_path: str, out: str, cookies_path: str | None = None, limit: int | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, note_keyword: str | None = None, keyword_only: bool = False, concurrency: int = 1, workers: int = 1, block_policy: dict | None = None, fetch_mode: str = 'browser', capture_images: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, resume: bool = False):
+    journal = CrawlJournal(str(journal_path(out)))
+    state = load_resume_state(journal, 'csv', csv_path) if resume else None
+    if state is not None:
+        # 关键词筛选与去重已在原任务中完成，直接处理未完成的链接
+        links = CrawlJournal.pending_links(state)
+        note_keyword = None
+    else:
+        links = load_links_from_csv(csv_path)
+        if not links:
+            print(f"[warn] CSV 未读取到有效链接: {csv_path}")
+            return
     
-    print(f"[info] CSV 读取到 {len(links)} 个链接")
+        print(f"[info] CSV 读取到 {len(links)} 个链接")
     
-    # 获取已存在的 note_id 并去重、过滤链接
-    existing_ids = get_existing_note_ids(out, out_format) if skip_existing else set()
-    links, dup_count, skip_count = deduplicate_and_filter_links(links, existing_ids, skip_existing)
+        # 获取已存在的 note_id 并去重、过滤链接
+        existing_ids = get_existing_note_ids(out, out_format) if skip_existing else set()
+        links, dup_count, skip_count = deduplicate_and_filter_links(links, existing_ids, skip_existing)
     
-    if dup_count > 0:
-        print(f"[info] 去除重复链接: {dup_count} 个")
-    if skip_count > 0:
-        print(f"[info] 跳过已存在的帖子: {skip_count} 个")
+        if dup_count > 0:
+            print(f"[info] 去除重复链接: {dup_count} 个")
+        if skip_count > 0:
+            print(f"[info] 跳过已存在的帖子: {skip_count} 个")
     
-    # 应用 limit 限制
-    if limit and len(links) > limit:
-        links = links[:limit]
+        # 应用 limit 限制
+        if limit and len(links) > limit:
+            links = links[:limit]
     
-    if not links:
-        print("[info] 没有需要处理的链接")
-        return
+        if not links:
+            print("[info] 没有需要处理的链接")
+            return
+        journal.start_run('csv', csv_path)
     
     print(f"[info] 即将处理 {len(links)} 个链接")
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=headless)
-        context = browser.new_context(
-            user_agent=user_agent or DEFAULT_USER_AGENT,
-            viewport={"width": 1366, "height": 860},
-            locale="zh-CN",
-            timezone_id="Asia/Shanghai",
-        )
+    async with async_playwright() as pw:
         cookies = load_cookies(cookies_path)
-        if cookies:
-            print(f"[info] 导入 cookies: {len(cookies)} 条")
-            try:
-                context.add_cookies(cookies)
-            except Exception as e:
-                print(f"[warn] 添加 cookies 失败: {e}")
+        # 浏览器按需启动：HTTP 模式下仅在关键词筛选或解析失败时才需要
+        browser = context = None
+        if links and (note_keyword or fetch_mode != 'http'):
+            browser, context = await new_browser_context(pw, headless=headless, user_agent=user_agent, cookies=cookies, block_policy=block_policy, profile_dir=profile_dir, asset_cache=asset_cache)
         
         # 如果指定了关键词，获取标题并筛选
         if note_keyword:
-            notes_info = cache_note_info(links, out, context, timeout_ms)
+            notes_info = await cache_note_info(links, out, context, timeout_ms, page_recycle)
             keyword_links, other_links = filter_links_by_keyword(links, notes_info, note_keyword, keyword_only)
             
             if keyword_only:
@@ -944,63 +2700,261 @@ def run_from_csv(csv_path: str, out: str, cookies_path: str | None = None, limit
                 links = keyword_links + other_links
                 print(f"[info] 优先下载 {len(keyword_links)} 个关键词匹配帖子，然后下载 {len(other_links)} 个其他帖子")
         
-        results = []
-        for idx, url in enumerate(links, start=1):
-            print(f"[info] [{idx}/{len(links)}] 打开帖子: {url}")
-            detail = context.new_page()
-            detail.set_default_navigation_timeout(timeout_ms)
-            detail.set_default_timeout(timeout_ms)
+        saved = []
+        if state is None:
+            journal.queued(links)
+        else:
+            saved = await save_fetched_posts(state, out, out_format, block_policy, concurrency=concurrency, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+        results = saved + await crawl_details(pw, links, out, browser=browser, context=context, cookies=cookies, headless=headless, timeout_ms=timeout_ms, user_agent=user_agent, out_format=out_format, concurrency=concurrency, workers=workers, block_policy=block_policy, fetch_mode=fetch_mode, capture_images=capture_images, page_recycle=page_recycle, profile_dir=profile_dir, asset_cache=asset_cache, image_concurrency=image_concurrency, image_store=image_store, journal=journal)
+        if state is not None:
+            results = merge_resumed_results(state, results)
+        journal.finish_run()
+        # 索引由帖子目录生成，始终包含此前保存的全部帖子
+        print(f"[done] 已保存 {len(results)} 个帖子。索引: {build_indexes(out, out_format)}")
+
+
+def run_from_csv(csv_path: str, out: str, cookies_path: str | None = None, limit: int | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, note_keyword: str | None = None, keyword_only: bool = False, concurrency: int = 1, workers: int = 1, block_policy: dict | None = None, fetch_mode: str = 'browser', capture_images: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False, resume: bool = False):
+    """同步入口：在事件循环中运行 run_from_csv_async，参数同 run_from_csv_async。"""
+    asyncio.run(run_from_csv_async(csv_path, out, cookies_path=cookies_path, limit=limit, headless=headless, timeout_ms=timeout_ms, user_agent=user_agent, out_format=out_format, skip_existing=skip_existing, note_keyword=note_keyword, keyword_only=keyword_only, concurrency=concurrency, workers=workers, block_policy=block_policy, fetch_mode=fetch_mode, capture_images=capture_images, page_recycle=page_recycle, profile_dir=profile_dir, asset_cache=asset_cache, image_concurrency=image_concurrency, image_store=image_store, resume=resume))
+
+
+DEFAULT_SERVE_ADDRESS = '127.0.0.1:8765'
+# 守护进程任务可覆盖的参数，其余沿用启动守护进程时的命令行参数
+JOB_OPTION_KEYS = ('out', 'out_format', 'limit', 'skip_existing', 'concurrency', 'stop_after_known')
+HTTP_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+def parse_serve_address(address: str) -> tuple[str, str, int | None]:
+    """解析监听地址：'unix:/path/to.sock' 或 'host:port'。
+
+    Returns:
+        ('unix', 路径, None) 或 ('tcp', 主机, 端口)
+    """
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):], None
+    host, _, port = address.rpartition(':')
+    return 'tcp', host or '127.0.0.1', int(port)
+
+
+def validate_job_options(params: dict, defaults: dict):
+    """校验任务参数的类型与取值，不合法时抛出 ValueError。
+
+    concurrency、limit 为大于等于 1 的整数（limit 可为 null 表示不限制），stop_after_known 为非负整数（0 表示滚动到底），
+    skip_existing 为布尔值，out_format 为 html 或 markdown，out 须为守护进程默认输出目录或其子目录。
+    """
+    def is_int(value) -> bool:
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    if 'concurrency' in params and not (is_int(params['concurrency']) and params['concurrency'] >= 1):
+        raise ValueError('concurrency 必须是大于等于 1 的整数')
+    if params.get('limit') is not None and not (is_int(params['limit']) and params['limit'] >= 1):
+        raise ValueError('limit 必须是大于等于 1 的整数或 null')
+    if 'stop_after_known' in params and not (is_int(params['stop_after_known']) and params['stop_after_known'] >= 0):
+        raise ValueError('stop_after_known 必须是非负整数')
+    if 'skip_existing' in params and not isinstance(params['skip_existing'], bool):
+        raise ValueError('skip_existing 必须是布尔值')
+    if 'out_format' in params and params['out_format'] not in ('html', 'markdown'):
+        raise ValueError('out_format 必须是 html 或 markdown')
+    if 'out' in params:
+        if not isinstance(params['out'], str) or not params['out'].strip():
+            raise ValueError('out 必须是非空字符串')
+        base = Path(defaults['out']).resolve()
+        if not Path(params['out']).resolve().is_relative_to(base):
+            raise ValueError(f'out 必须是 {base} 或其子目录')
+
+
+def new_job(params: dict, defaults: dict) -> dict:
+    """校验任务参数并创建任务记录，参数不合法时抛出 ValueError。"""
+    sources = [key for key in ('user', 'csv', 'links') if params.get(key)]
+    if len(sources) != 1:
+        raise ValueError('必须且只能提供 user、csv、links 之一')
+    if 'links' in sources and not (isinstance(params['links'], list) and all(isinstance(u, str) for u in params['links'])):
+        raise ValueError('links 必须是帖子链接数组')
+    if sources[0] in ('user', 'csv') and not isinstance(params[sources[0]], str):
+        raise ValueError(f'{sources[0]} 必须是字符串')
+    unknown = set(params) - set(JOB_OPTION_KEYS) - {'user', 'csv', 'links'}
+    if unknown:
+        raise ValueError(f"不支持的参数: {', '.join(sorted(unknown))}")
+    validate_job_options(params, defaults)
+    options = {key: params.get(key, defaults.get(key)) for key in JOB_OPTION_KEYS}
+    return {
+        'id': f"{int(time.time() * 1000):x}-{os.urandom(2).hex()}",
+        'source': sources[0],
+        'target': params[sources[0]],
+        'options': options,
+        'status': 'queued',
+        'total': None,
+        'done': 0,
+        'saved': 0,
+        'results': [],
+        'index': None,
+        'error': None,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+    }
+
+
+def job_view(job: dict, with_results: bool = True) -> dict:
+    """任务的对外表示，列表接口不返回结果明细。"""
+    view = {k: v for k, v in job.items() if k != 'results'}
+    if with_results:
+        view['results'] = job['results']
+    return view
+
+
+async def run_job(job: dict, context, timeout_ms: int = 30000, block_policy: dict | None = None, capture_images: bool = False, page_recycle: dict | None = None, profile_source: str = 'feed', image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False):
+    """在常驻浏览器上下文中执行一个任务，进度写回 job。"""
+    options = job['options']
+    out = options['out']
+    out_format = options['out_format'] or 'html'
+    limit = options['limit']
+    skip_existing = bool(options['skip_existing'])
+    existing_ids = get_existing_note_ids(out, out_format) if skip_existing else set()
+    if job['source'] == 'user':
+        links, _ = await collect_profile_links(context, job['target'], timeout_ms=timeout_ms, limit=limit, profile_source=profile_source, known_ids=existing_ids, stop_after_known=options['stop_after_known'] or 0)
+    elif job['source'] == 'csv':
+        links = load_links_from_csv(job['target'])
+    else:
+        links = [str(u) for u in job['target']]
+    links, dup_count, skip_count = deduplicate_and_filter_links(links, existing_ids, skip_existing)
+    if limit:
+        links = links[:limit]
+    job['total'] = len(links)
+    print(f"[info] 任务 {job['id']}: 待处理帖子 {len(links)} 个（去重 {dup_count}，跳过 {skip_count}）")
+
+    def on_done(url: str, entry: dict | None):
+        job['done'] += 1
+        if entry:
+            job['saved'] += 1
+
+    results = await crawl_links(links, out, context, timeout_ms=timeout_ms, out_format=out_format, concurrency=max(1, options['concurrency'] or 1), block_policy=block_policy, capture_images=capture_images, page_recycle=page_recycle, on_done=on_done, image_concurrency=image_concurrency, image_store=image_store)
+    job['results'] = results
+    job['index'] = build_indexes(out, out_format)
+
+
+def route_api_request(method: str, path: str, body: bytes, jobs: dict, job_queue: asyncio.Queue, defaults: dict) -> tuple[int, dict]:
+    """任务接口路由。
+
+    GET /health、GET /jobs、GET /jobs/<id>、POST /jobs（JSON：user / csv / links 之一，另可带 JOB_OPTION_KEYS 中的参数）。
+    """
+    path = urlparse(path).path.rstrip('/') or '/'
+    if path == '/health' and method == 'GET':
+        return 200, {'status': 'ok', 'queued': job_queue.qsize(), 'jobs': len(jobs)}
+    if path == '/jobs':
+        if method == 'GET':
+            return 200, {'jobs': [job_view(job, with_results=False) for job in jobs.values()]}
+        if method == 'POST':
             try:
-                detail.goto(url, wait_until='domcontentloaded')
-                try:
-                    detail.wait_for_load_state('load')
-                except Exception:
-                    pass
+                params = json.loads(body.decode('utf-8') or '{}')
+                if not isinstance(params, dict):
+                    raise ValueError('请求体必须是 JSON 对象')
+                job = new_job(params, defaults)
+            except ValueError as e:
+                return 400, {'error': str(e)}
+            jobs[job['id']] = job
+            job_queue.put_nowait(job)
+            print(f"[info] 收到任务 {job['id']}: {job['source']}")
+            return 202, job_view(job, with_results=False)
+        return 405, {'error': f'不支持的方法: {method}'}
+    if path.startswith('/jobs/') and method == 'GET':
+        job = jobs.get(path[len('/jobs/'):])
+        if job is None:
+            return 404, {'error': '任务不存在'}
+        return 200, job_view(job)
+    return 404, {'error': f'未知接口: {path}'}
+
+
+async def handle_api_connection(reader, writer, jobs: dict, job_queue: asyncio.Queue, defaults: dict):
+    """处理一个 HTTP/1.1 请求（Connection: close），返回 JSON。"""
+    try:
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        method, path = request_line.split(' ')[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length') or 0))
+        status, payload = route_api_request(method.upper(), path, body, jobs, job_queue, defaults)
+    except Exception as e:
+        status, payload = 400, {'error': f'无效请求: {e}'}
+    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n"
+    try:
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_async(address: str = DEFAULT_SERVE_ADDRESS, out: str = 'output', cookies_path: str | None = None, headless: bool = True, timeout_ms: int = 30000, user_agent: str | None = None, out_format: str = 'html', skip_existing: bool = False, concurrency: int = 1, block_policy: dict | None = None, capture_images: bool = False, page_recycle: dict | None = None, profile_dir: str | None = None, profile_source: str = 'feed', stop_after_known: int = 0, asset_cache: dict | None = None, image_concurrency: int = DEFAULT_IMAGE_CONCURRENCY, image_store: bool = False):
+    """守护进程模式：常驻一个浏览器上下文，通过本地 HTTP（TCP 或 Unix socket）接口接收任务并依次执行。"""
+    defaults = {'out': out, 'out_format': out_format, 'limit': None, 'skip_existing': skip_existing, 'concurrency': concurrency, 'stop_after_known': stop_after_known}
+    jobs: dict[str, dict] = {}
+    job_queue: asyncio.Queue = asyncio.Queue()
+    async with async_playwright() as pw:
+        cookies = load_cookies(cookies_path)
+        browser, context = await new_browser_context(pw, headless=headless, user_agent=user_agent, cookies=cookies, block_policy=block_policy, profile_dir=profile_dir, asset_cache=asset_cache)
+
+        def watch_context(ctx) -> dict:
+            # 持久化浏览器目录没有独立的 browser 对象，通过上下文的 close 事件感知浏览器退出
+            state = {'closed': False}
+            ctx.on('close', lambda _: state.update(closed=True))
+            return state
+
+        context_state = watch_context(context)
+
+        async def job_runner():
+            nonlocal browser, context, context_state
+            while True:
+                job = await job_queue.get()
+                job['status'] = 'running'
+                job['started_at'] = time.time()
                 try:
-                    detail.wait_for_load_state('networkidle', timeout=2000)
-                except Exception:
-                    pass
-            except PlaywrightTimeoutError:
-                print(f"[warn] 打开帖子超时: {url}")
-            detail.wait_for_timeout(1200)
-            try:
-                data = extract_post_content(detail, url)
-            except Exception as e:
-                print(f"[warn] 提取帖子内容失败: {e}")
-                data = {
-                    'url': url,
-                    'note_id': None,
-                    'title': '提取失败',
-                    'description': '',
-                    'content_text': '',
-                    'images': [],
-                    'videos': [],
-                    'downloaded_images': [],
-                }
-            # 提取并下载轮播图片
-            try:
-                swiper_imgs = extract_swiper_images(detail)
-                if swiper_imgs:
-                    local_files = download_images(swiper_imgs, Path(out) / 'images', prefix=(data.get('note_id') or f'post-{idx}'), referer=url)
-                    data['downloaded_images'] = [f"images/{Path(p).name}" for p in local_files]
-            except Exception as e:
-                print(f"[warn] 下载轮播图片失败: {e}")
-            fname_base = data.get('note_id') or f"post-{idx}"
-            safe_title = re.sub(r'[\\/:*?\"<>|]+', '_', data.get('title') or '')
-            ext = 'html' if out_format == 'html' else 'md'
-            filename = f"{fname_base}_{safe_title[:50]}.{ext}" if safe_title else f"{fname_base}.{ext}"
-            if out_format == 'html':
-                file_path = save_document(render_post_html(data), out, filename, skip_if_exists=False)
-            else:
-                file_path = save_document(render_post_markdown(data), out, filename, skip_if_exists=False)
-            results.append({'file': os.path.basename(file_path), 'title': data.get('title'), 'url': url, 'note_id': data.get('note_id')})
-            detail.close()
-        # 合并已存在的索引，因为我们已经在处理前过滤了已存在的帖子
-        index_html = build_index_html(results, out, merge_existing=skip_existing)
-        index_md = build_index_markdown(results, out, merge_existing=skip_existing) if out_format == 'markdown' else None
-        print(f"[done] 已保存 {len(results)} 个帖子。索引: {index_html}{' / ' + index_md if index_md else ''}")
-        context.close()
-        browser.close()
+                    # 重新启动失败时本任务记为失败，下一个任务再次尝试启动
+                    if context_state['closed'] or (browser is not None and not browser.is_connected()):
+                        print("[warn] 浏览器已断开，重新启动")
+                        browser, context = await new_browser_context(pw, headless=headless, user_agent=user_agent, cookies=cookies, block_policy=block_policy, profile_dir=profile_dir, asset_cache=asset_cache)
+                        context_state = watch_context(context)
+                    await run_job(job, context, timeout_ms=timeout_ms, block_policy=block_policy, capture_images=capture_images, page_recycle=page_recycle, profile_source=profile_source, image_concurrency=image_concurrency, image_store=image_store)
+                    job['status'] = 'done'
+                    print(f"[done] 任务 {job['id']}: 已保存 {job['saved']} 个帖子。索引: {job['index']}")
+                except Exception as e:
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                    print(f"[warn] 任务 {job['id']} 失败: {e}")
+                job['finished_at'] = time.time()
+
+        def handler(reader, writer):
+            return handle_api_connection(reader, writer, jobs, job_queue, defaults)
+
+        kind, host, port = parse_serve_address(address)
+        if kind == 'unix':
+            server = await asyncio.start_unix_server(handler, path=host)
+        else:
+            server = await asyncio.start_server(handler, host=host, port=port)
+        print(f"[info] 守护进程已启动，监听 {address}")
+        runner = asyncio.create_task(job_runner())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            runner.cancel()
+            await close_browser_context(browser, context, profile_dir)
+            if kind == 'unix':
+                Path(host).unlink(missing_ok=True)
+
+
+def serve(address: str = DEFAULT_SERVE_ADDRESS, **kwargs):
+    """同步入口：运行守护进程直到被中断，参数同 serve_async。"""
+    try:
+        asyncio.run(serve_async(address, **kwargs))
+    except KeyboardInterrupt:
+        print("[info] 守护进程已停止")
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="小红书用户帖子爬取并保存为本地 HTML")
@@ -1016,15 +2970,104 @@ def parse_args():
     parser.add_argument('--skip-existing', action='store_true', help='跳过已存在的文件，不覆盖（会合并到索引中）')
     parser.add_argument('--note-keyword', help='可选，筛选标题中包含指定关键词的帖子')
     parser.add_argument('--keyword-only', action='store_true', help='仅下载包含关键词的帖子（需配合 --note-keyword 使用），默认为优先下载关键词帖子然后下载其他帖子')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时处理的帖子详情页数量，默认 1（逐个处理）')
+    parser.add_argument('--workers', type=int, default=1, help='多进程分片数量，每个进程使用独立浏览器，默认 1')
+    parser.add_argument('--fetch-mode', choices=['browser', 'http'], default='browser', help='帖子详情抓取方式：browser 使用浏览器；http 直接请求页面解析内嵌数据，失败的再交由浏览器处理')
+    parser.add_argument('--capture-images', action='store_true', help='直接保存浏览器渲染时已加载的轮播图片，仅对页面未加载的图片单独下载')
+    parser.add_argument('--profile-source', choices=['feed', 'dom'], default='feed', help='主页帖子采集方式：feed 记录帖子列表接口响应（保留 xsec_token 与标题），dom 从页面链接采集；feed 无数据时自动回退到 dom')
+    parser.add_argument('--stop-after-known', type=int, default=0, help='配合 --skip-existing：滚动主页时连续遇到 N 个已下载帖子即停止（主页按时间倒序），0 表示滚动到底')
+    parser.add_argument('--stream', action='store_true', help='主页模式下边滚动边抓取帖子详情，无需等待滚动结束；与 --note-keyword 或 --workers > 1 同时使用时不生效')
+    parser.add_argument('--page-max-uses', type=int, default=DEFAULT_PAGE_MAX_USES, help=f'单个详情页复用的最大导航次数，超出后关闭并新建，默认 {DEFAULT_PAGE_MAX_USES}，0 表示不限制')
+    parser.add_argument('--page-max-heap-mb', type=int, default=DEFAULT_PAGE_MAX_HEAP_MB, help=f'详情页 JS 堆内存超过该值（MB）时关闭并新建，默认 {DEFAULT_PAGE_MAX_HEAP_MB}，0 表示不限制')
+    parser.add_argument('--resume', action='store_true', help='从输出目录的任务日志（.tmp/journal.jsonl）继续上次中断的任务：不再滚动主页，仅处理尚未完成的帖子')
+    parser.add_argument('--profile-dir', help='持久化浏览器目录：保留磁盘缓存、Service Worker 与登录状态，后续运行可省略 --cookies；不能被多个运行同时使用')
+    parser.add_argument('--serve', nargs='?', const=DEFAULT_SERVE_ADDRESS, metavar='ADDRESS', help=f'守护进程模式：常驻浏览器并通过本地 HTTP 接口接收任务，地址为 host:port 或 unix:/path.sock，默认 {DEFAULT_SERVE_ADDRESS}')
+    parser.add_argument('--asset-cache', metavar='DIR', help='静态资源磁盘缓存目录：带哈希的 JS/CSS/字体文件在页面与多次运行间复用')
+    parser.add_argument('--asset-cache-mb', type=int, default=DEFAULT_ASSET_CACHE_MB, help=f'静态资源缓存容量上限（MB），超出后按最近使用时间淘汰，默认 {DEFAULT_ASSET_CACHE_MB}')
+    parser.add_argument('--image-concurrency', type=int, default=DEFAULT_IMAGE_CONCURRENCY, help=f'每个图片主机同时进行的下载数，所有帖子共享连接池，默认 {DEFAULT_IMAGE_CONCURRENCY}')
+    parser.add_argument('--image-store', action='store_true', help='按内容去重保存图片：相同内容只保存一份，images/ 下的文件为硬链接，已知 URL 或 ETag 的图片不再下载')
+    parser.add_argument('--compact-images', action='store_true', help='整理输出目录中的图片：按内容去重为硬链接并删除无人引用的内容，完成后退出')
+    parser.add_argument('--search', metavar='QUERY', help='在 --out 目录的已保存帖子中全文检索（标题与正文），输出排序后的结果与摘要后退出')
+    parser.add_argument('--search-limit', type=int, default=20, help='--search 最多显示的结果数，默认 20')
+    parser.add_argument('--block-preset', choices=list(BLOCK_PRESETS), default='none', help='请求拦截预设：none 不拦截；text+image-urls 拦截图片/视频/字体与埋点，仍下载轮播图片；text-only 另拦截样式表且不下载图片')
+    parser.add_argument('--block-types', help='额外按资源类型拦截，逗号分隔，如 image,media,font')
+    parser.add_argument('--block-url', action='append', default=[], help='额外拦截匹配该正则的请求 URL，可多次指定')
+    parser.add_argument('--allow-url', action='append', default=[], help='始终放行匹配该正则的请求 URL，可多次指定')
     args = parser.parse_args()
-    if not args.user and not args.csv:
-        parser.error('必须提供 --user 或 --csv 之一')
+    if not args.user and not args.csv and not args.serve and not args.compact_images and not args.search:
+        parser.error('必须提供 --user、--csv、--serve、--compact-images 或 --search 之一')
+    if args.search_limit < 1:
+        parser.error('--search-limit 必须大于等于 1')
+    if args.serve:
+        try:
+            parse_serve_address(args.serve)
+        except ValueError:
+            parser.error(f'无效的监听地址: {args.serve}')
+    if args.concurrency < 1:
+        parser.error('--concurrency 必须大于等于 1')
+    if args.workers < 1:
+        parser.error('--workers 必须大于等于 1')
+    if args.image_concurrency < 1:
+        parser.error('--image-concurrency 必须大于等于 1')
+    if args.page_max_uses < 0 or args.page_max_heap_mb < 0:
+        parser.error('--page-max-uses / --page-max-heap-mb 不能为负数')
+    args.page_recycle = {'max_uses': args.page_max_uses, 'max_heap_mb': args.page_max_heap_mb}
+    if args.asset_cache_mb < 0:
+        parser.error('--asset-cache-mb 不能为负数')
+    args.asset_cache = {'dir': args.asset_cache, 'max_bytes': args.asset_cache_mb * 1024 * 1024} if args.asset_cache else None
+    if args.stop_after_known < 0:
+        parser.error('--stop-after-known 不能为负数')
+    if args.stop_after_known and not args.skip_existing:
+        print("[warn] --stop-after-known 需配合 --skip-existing 使用，已忽略。")
+    if args.stream and (args.note_keyword or args.workers > 1 or args.csv):
+        print("[warn] --stream 仅用于主页模式，且不能与 --note-keyword、--workers > 1 同时使用，已改为先滚动后抓取。")
+    try:
+        args.block_policy = build_block_policy(
+            args.block_preset,
+            block_types=[t.strip() for t in (args.block_types or '').split(',') if t.strip()],
+            deny_patterns=args.block_url,
+            allow_patterns=args.allow_url,
+        )
+    except re.error as e:
+        parser.error(f'无效的 URL 正则: {e}')
+    if args.capture_images and args.block_policy and 'image' in args.block_policy['resource_types']:
+        parser.error('--capture-images 需要浏览器加载图片，不能与拦截 image 类型的规则同时使用')
     return args
 
 
 if __name__ == '__main__':
     args = parse_args()
-    if args.csv:
+    if args.search:
+        search_archive(args.out, args.search, limit=args.search_limit)
+    elif args.compact_images:
+        images_dir = Path(args.out) / 'images'
+        if not images_dir.exists():
+            print(f"[warn] 图片目录不存在: {images_dir}")
+        else:
+            stats = compact_images(str(images_dir))
+            print(f"[done] 图片整理完成：入库 {stats['adopted']} 张，去重 {stats['deduplicated']} 张，删除无引用内容 {stats['removed_blobs']} 个，释放 {stats['freed_bytes'] / 1024 / 1024:.1f} MB")
+    elif args.serve:
+        serve(
+            address=args.serve,
+            out=args.out,
+            cookies_path=args.cookies,
+            headless=not args.no_headless,
+            timeout_ms=args.timeout,
+            user_agent=args.user_agent,
+            out_format=args.format,
+            skip_existing=args.skip_existing,
+            concurrency=args.concurrency,
+            block_policy=args.block_policy,
+            capture_images=args.capture_images,
+            page_recycle=args.page_recycle,
+            profile_dir=args.profile_dir,
+            asset_cache=args.asset_cache,
+            image_concurrency=args.image_concurrency,
+            image_store=args.image_store,
+            profile_source=args.profile_source,
+            stop_after_known=args.stop_after_known,
+        )
+    elif args.csv:
         run_from_csv(
             csv_path=args.csv,
             out=args.out,
@@ -1037,6 +3080,17 @@ if __name__ == '__main__':
             skip_existing=args.skip_existing,
             note_keyword=args.note_keyword,
             keyword_only=args.keyword_only,
+            concurrency=args.concurrency,
+            workers=args.workers,
+            block_policy=args.block_policy,
+            fetch_mode=args.fetch_mode,
+            capture_images=args.capture_images,
+            page_recycle=args.page_recycle,
+            profile_dir=args.profile_dir,
+            asset_cache=args.asset_cache,
+            image_concurrency=args.image_concurrency,
+            image_store=args.image_store,
+            resume=args.resume,
         )
     else:
         run(
@@ -1051,4 +3105,18 @@ if __name__ == '__main__':
             skip_existing=args.skip_existing,
             note_keyword=args.note_keyword,
             keyword_only=args.keyword_only,
+            concurrency=args.concurrency,
+            workers=args.workers,
+            block_policy=args.block_policy,
+            fetch_mode=args.fetch_mode,
+            capture_images=args.capture_images,
+            page_recycle=args.page_recycle,
+            profile_dir=args.profile_dir,
+            asset_cache=args.asset_cache,
+            image_concurrency=args.image_concurrency,
+            image_store=args.image_store,
+            profile_source=args.profile_source,
+            stop_after_known=args.stop_after_known,
+            stream=args.stream,
+            resume=args.resume,
         )
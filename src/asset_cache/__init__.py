@@ -0,0 +1,5 @@
+"""静态资源缓存模块 - 按内容寻址的磁盘缓存，供浏览器请求路由使用"""
+
+from .disk_cache import AssetCache, is_cacheable_asset
+
+__all__ = ['AssetCache', 'is_cacheable_asset']
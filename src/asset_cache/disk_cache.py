@@ -0,0 +1,189 @@
+"""
+静态资源磁盘缓存
+按内容哈希存储带版本哈希的 JS/CSS/字体文件，超出容量时按最近使用时间淘汰
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHEABLE_RESOURCE_TYPES = {'script', 'stylesheet', 'font'}
+# 文件名中带内容哈希的静态资源（如 vendor.77f9fe85.js）视为不可变
+HASHED_ASSET_RE = re.compile(r'[.\-_][0-9a-f]{8,}\.(?:js|mjs|css|woff2?|ttf|otf)$', re.IGNORECASE)
+# 回放时保留的响应头
+KEPT_HEADERS = ('content-type', 'access-control-allow-origin', 'cache-control', 'timing-allow-origin')
+# 清理无引用对象时保留最近写入的文件（秒）
+ORPHAN_GRACE_SECONDS = 60
+# 写入缓存后至多每隔多少秒写回一次索引（关闭时总会写回）
+INDEX_FLUSH_SECONDS = 5
+
+
+def is_cacheable_asset(url: str, resource_type: str) -> bool:
+    """判断请求是否为可长期缓存的带哈希静态资源。"""
+    if resource_type not in CACHEABLE_RESOURCE_TYPES:
+        return False
+    path = url.split('#', 1)[0].split('?', 1)[0]
+    return bool(HASHED_ASSET_RE.search(path))
+
+
+class AssetCache:
+    """按内容寻址的静态资源缓存
+
+    对象文件保存在 objects/<sha256 前两位>/<sha256>，index.json 记录 URL 到对象的映射与最近使用时间。
+    多个进程共享同一目录时，保存索引会合并磁盘上的记录。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），0 表示不限制
+        """
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / 'objects'
+        self.index_file = self.cache_dir / 'index.json'
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.entries: Dict[str, Dict] = self._read_index()
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+
+    def _read_index(self) -> Dict[str, Dict]:
+        if not self.index_file.exists():
+            return {}
+        try:
+            data = json.loads(self.index_file.read_text(encoding='utf-8'))
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            print(f"[warn] 读取静态资源缓存索引失败: {e}")
+            return {}
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def get(self, url: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """
+        读取缓存
+
+        Returns:
+            (响应体, 响应头)；未命中返回 None
+        """
+        entry = self.entries.get(url)
+        if entry:
+            try:
+                body = self._object_path(entry['sha256']).read_bytes()
+            except OSError:
+                body = None
+            if body is not None:
+                entry['last_used'] = time.time()
+                self.hits += 1
+                return body, dict(entry.get('headers') or {})
+            self.entries.pop(url, None)
+        self.misses += 1
+        return None
+
+    def put(self, url: str, body: bytes, headers: Dict[str, str]):
+        """写入缓存：对象文件先写临时文件再原子重命名，相同内容只保存一份。
+
+        写入后立即按容量上限淘汰，索引至多每 INDEX_FLUSH_SECONDS 秒写回一次，
+        长期运行（如 --serve）时缓存不会超出上限，图片较多的页面也不会因每次写回索引阻塞事件循环。
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{digest}.{os.getpid()}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        self.entries[url] = {
+            'sha256': digest,
+            'size': len(body),
+            'headers': {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+            'last_used': time.time(),
+        }
+        self.stored += 1
+        self._enforce_limit()
+        self._dirty = True
+        self.flush()
+
+    def flush(self, force: bool = False):
+        """索引有改动且距上次写回已超过 INDEX_FLUSH_SECONDS 秒（或 force）时写回索引。"""
+        if self._dirty and (force or time.monotonic() - self._flushed_at >= INDEX_FLUSH_SECONDS):
+            self._write_index()
+
+    def _enforce_limit(self):
+        """按最近使用时间淘汰条目，直到总大小不超过上限，并删除被淘汰且不再被引用的对象文件。"""
+        sizes: Dict[str, int] = {}
+        for entry in self.entries.values():
+            sizes[entry['sha256']] = entry['size']
+        total = sum(sizes.values())
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+        refs: Dict[str, int] = {}
+        for entry in self.entries.values():
+            refs[entry['sha256']] = refs.get(entry['sha256'], 0) + 1
+        for url, entry in sorted(self.entries.items(), key=lambda item: item[1].get('last_used', 0)):
+            if total <= self.max_bytes:
+                break
+            del self.entries[url]
+            self.evicted += 1
+            digest = entry['sha256']
+            refs[digest] -= 1
+            if not refs[digest]:
+                total -= sizes.pop(digest, 0)
+                self._object_path(digest).unlink(missing_ok=True)
+
+    def _write_index(self):
+        """合并磁盘上的索引（保留较新的使用时间，跳过对象已删除的条目）后原子写回。"""
+        for url, entry in self._read_index().items():
+            current = self.entries.get(url)
+            if current is None or entry.get('last_used', 0) > current.get('last_used', 0):
+                if self._object_path(entry['sha256']).exists():
+                    self.entries[url] = entry
+        tmp = self.index_file.with_name(f"index.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.entries, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.index_file)
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+
+    def evict(self):
+        """按容量上限淘汰，并删除不再被引用的对象文件（最近写入的对象可能属于尚未写回索引的其他进程，予以保留）。"""
+        self._enforce_limit()
+        referenced = {entry['sha256'] for entry in self.entries.values()}
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for path in self.objects_dir.glob('*/*'):
+            if path.name in referenced or path.name.endswith('.tmp'):
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def save(self):
+        """合并磁盘上的索引，淘汰超出容量的条目与无引用的对象后原子写回。"""
+        self._write_index()
+        self.evict()
+        self._write_index()
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中/写入/淘汰计数与当前缓存大小。"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stored': self.stored,
+            'evicted': self.evicted,
+            'entries': len(self.entries),
+            'bytes': sum({e['sha256']: e['size'] for e in self.entries.values()}.values()),
+        }
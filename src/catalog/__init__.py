@@ -0,0 +1,5 @@
+"""帖子目录模块 - 用 SQLite 记录已保存的帖子，供增量下载、去重与索引生成查询"""
+
+from .note_catalog import CATALOG_FILENAME, NoteCatalog
+
+__all__ = ['CATALOG_FILENAME', 'NoteCatalog']
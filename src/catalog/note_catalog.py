@@ -0,0 +1,241 @@
+"""
+帖子目录数据库
+输出目录中的 catalog.db（SQLite）记录每个已保存帖子的 note_id、原帖链接、标题、文件名、
+图片列表、内容哈希与时间戳，增量下载、去重与索引生成直接查询，无需扫描目录或解析索引文件
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+CATALOG_FILENAME = 'catalog.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    note_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    file TEXT NOT NULL,
+    format TEXT NOT NULL,
+    images TEXT NOT NULL DEFAULT '[]',
+    content_hash TEXT,
+    text TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (note_id, format)
+);
+DROP INDEX IF EXISTS notes_url;
+CREATE INDEX IF NOT EXISTS notes_format ON notes (format, note_id);
+CREATE INDEX IF NOT EXISTS notes_updated ON notes (updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+# 后续版本新增的列：打开旧数据库时自动补齐
+ADDED_COLUMNS = {'text': 'TEXT'}
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict:
+    entry = dict(row)
+    entry['images'] = json.loads(entry['images'] or '[]')
+    return entry
+
+
+class NoteCatalog:
+    """输出目录的帖子目录
+
+    同一帖子的 HTML 与 Markdown 文件各占一条记录（note_id + 格式唯一）。
+    seq 为首次写入的顺序号，更新帖子时不变，索引按 seq 排序以保证顺序稳定、新帖子只需追加。
+    线程安全；多个进程（如分片进程）可同时写入同一数据库，写入冲突时 SQLite 自动等待。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        打开（必要时创建）目录数据库
+
+        Args:
+            db_path: 数据库文件路径（如 output/catalog.db）
+        """
+        self.path = Path(db_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(notes)')}
+            for name, decl in ADDED_COLUMNS.items():
+                if name not in columns:
+                    self._conn.execute(f'ALTER TABLE notes ADD COLUMN {name} {decl}')
+            self._conn.commit()
+
+    def upsert(self, entry: Dict, out_format: str, images: Optional[List[str]] = None, content_hash: Optional[str] = None, text: Optional[str] = None):
+        """
+        写入或更新一个帖子，保留首次写入时间
+
+        Args:
+            entry: 索引条目 {'note_id', 'url', 'title', 'file'}
+            out_format: 文件格式（html 或 markdown）
+            images: 本地图片相对路径列表
+            content_hash: 帖子文件内容的 sha256
+            text: 帖子正文（供检索）
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO notes (note_id, url, title, file, format, images, content_hash, text, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(note_id, format) DO UPDATE SET url=excluded.url, title=excluded.title, file=excluded.file, "
+                "images=excluded.images, content_hash=excluded.content_hash, text=excluded.text, updated_at=excluded.updated_at",
+                (entry['note_id'], entry['url'], entry.get('title'), entry['file'], out_format,
+                 json.dumps(images or [], ensure_ascii=False), content_hash, text, now, now),
+            )
+            self._conn.commit()
+
+    def import_entries(self, entries: Iterable[Dict]) -> int:
+        """
+        导入已有帖子（不覆盖已记录的帖子），用于从旧的输出目录迁移
+
+        Args:
+            entries: 条目 {'note_id', 'url', 'title', 'file', 'format'[, 'images', 'text', 'updated_at']}
+
+        Returns:
+            新增的帖子数
+        """
+        now = time.time()
+        rows = [
+            (e['note_id'], e['url'], e.get('title'), e['file'], e['format'],
+             json.dumps(e.get('images') or [], ensure_ascii=False), e.get('content_hash'), e.get('text'),
+             e.get('updated_at') or now, e.get('updated_at') or now)
+            for e in entries
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO notes (note_id, url, title, file, format, images, content_hash, text, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def get(self, note_id: str, out_format: Optional[str] = None) -> Optional[Dict]:
+        """按 note_id（及文件格式）查询帖子，不存在时返回 None。"""
+        with self._lock:
+            if out_format:
+                row = self._conn.execute("SELECT * FROM notes WHERE note_id = ? AND format = ?", (note_id, out_format)).fetchone()
+            else:
+                row = self._conn.execute("SELECT * FROM notes WHERE note_id = ? ORDER BY updated_at DESC", (note_id,)).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def note_files(self, out_format: Optional[str] = None) -> Dict[str, str]:
+        """已保存帖子的 note_id -> 文件名，可按文件格式筛选。"""
+        with self._lock:
+            if out_format:
+                rows = self._conn.execute("SELECT note_id, file FROM notes WHERE format = ?", (out_format,)).fetchall()
+            else:
+                rows = self._conn.execute("SELECT note_id, file FROM notes").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def set_url(self, note_id: str, out_format: str, url: str):
+        """修正帖子的原帖链接（更新时间随之变化，索引会重新生成所在分页）。"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notes SET url = ?, updated_at = ? WHERE note_id = ? AND format = ?",
+                (url, time.time(), note_id, out_format),
+            )
+            self._conn.commit()
+
+    def set_content(self, note_id: str, out_format: str, images: List[str], text: Optional[str]):
+        """补充帖子的图片列表与正文（更新时间随之变化，索引会重新生成所在分页）。"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notes SET images = ?, text = ?, updated_at = ? WHERE note_id = ? AND format = ?",
+                (json.dumps(images, ensure_ascii=False), text, time.time(), note_id, out_format),
+            )
+            self._conn.commit()
+
+    def entries(self, out_format: Optional[str] = None) -> List[Dict]:
+        """全部帖子，按最近更新时间倒序。"""
+        with self._lock:
+            if out_format:
+                rows = self._conn.execute("SELECT * FROM notes WHERE format = ? ORDER BY updated_at DESC", (out_format,)).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM notes ORDER BY updated_at DESC").fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+    def last_seq(self) -> int:
+        """当前最大的顺序号，没有帖子时为 0。"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM notes").fetchone()[0]
+
+    def entries_between(self, after_seq: int, upto_seq: int, out_format: Optional[str] = None) -> List[Dict]:
+        """顺序号在 (after_seq, upto_seq] 之间的帖子，按顺序号排列，可按文件格式筛选。"""
+        with self._lock:
+            if out_format:
+                rows = self._conn.execute(
+                    "SELECT * FROM notes WHERE seq > ? AND seq <= ? AND format = ? ORDER BY seq", (after_seq, upto_seq, out_format)
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM notes WHERE seq > ? AND seq <= ? ORDER BY seq", (after_seq, upto_seq)).fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+    def updated_since(self, since: float, upto_seq: int, out_format: Optional[str] = None) -> int:
+        """顺序号不超过 upto_seq 且在 since 之后被更新过的帖子数，可按文件格式筛选。"""
+        with self._lock:
+            if out_format:
+                return self._conn.execute(
+                    "SELECT COUNT(*) FROM notes WHERE updated_at > ? AND seq <= ? AND format = ?", (since, upto_seq, out_format)
+                ).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM notes WHERE updated_at > ? AND seq <= ?", (since, upto_seq)).fetchone()[0]
+
+    def updated_seqs(self, since: float, upto_seq: int, out_format: Optional[str] = None) -> List[int]:
+        """顺序号不超过 upto_seq 且在 since 之后被更新过的帖子的顺序号，可按文件格式筛选。"""
+        with self._lock:
+            if out_format:
+                rows = self._conn.execute(
+                    "SELECT seq FROM notes WHERE updated_at > ? AND seq <= ? AND format = ?", (since, upto_seq, out_format)
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT seq FROM notes WHERE updated_at > ? AND seq <= ?", (since, upto_seq)).fetchall()
+        return [row[0] for row in rows]
+
+    def page_counts(self, page_size: int, upto_seq: int, out_format: Optional[str] = None) -> Dict[int, int]:
+        """按顺序号分页（第 n 页为 ((n-1)*page_size, n*page_size]）时每页的帖子数，可按文件格式筛选。"""
+        with self._lock:
+            if out_format:
+                rows = self._conn.execute(
+                    "SELECT (seq - 1) / ? + 1 AS page, COUNT(*) FROM notes WHERE seq <= ? AND format = ? GROUP BY page",
+                    (page_size, upto_seq, out_format),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT (seq - 1) / ? + 1 AS page, COUNT(*) FROM notes WHERE seq <= ? GROUP BY page", (page_size, upto_seq)
+                ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def count(self) -> int:
+        """已记录的帖子数。"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,5 @@
+"""图片存储模块 - 按内容寻址去重保存图片，帖子图片以硬链接指向同一份内容"""
+
+from .store import ImageStore, compact_images
+
+__all__ = ['ImageStore', 'compact_images']
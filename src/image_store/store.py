@@ -0,0 +1,206 @@
+"""
+按内容寻址的图片存储
+每份图片内容只保存一个 blob（.store/blobs/<前两位>/<sha256><扩展名>），
+images/{note_id}_{序号}.ext 为指向 blob 的硬链接（不支持硬链接时复制），
+manifest.json 记录文件名、来源 URL、ETag 与内容哈希的对应关系
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+STORE_DIRNAME = '.store'
+# 每写入多少张图片保存一次清单，中断时最多丢失这部分记录（compact 可从文件内容恢复）
+SAVE_EVERY = 50
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """图片目录对应的内容寻址存储
+
+    线程安全；多个进程共享同一目录时，保存清单会合并磁盘上的记录。
+    """
+
+    def __init__(self, images_dir: str):
+        """
+        初始化存储
+
+        Args:
+            images_dir: 帖子图片目录（如 output/images），存储位于其中的 .store 子目录
+        """
+        self.images_dir = Path(images_dir)
+        self.root = self.images_dir / STORE_DIRNAME
+        self.blobs_dir = self.root / 'blobs'
+        self.manifest_file = self.root / 'manifest.json'
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.stored = 0
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        data = {}
+        if self.manifest_file.exists():
+            try:
+                data = json.loads(self.manifest_file.read_text(encoding='utf-8'))
+            except Exception as e:
+                print(f"[warn] 读取图片清单失败: {e}")
+        return {
+            'blobs': data.get('blobs') or {},
+            'files': data.get('files') or {},
+            'urls': data.get('urls') or {},
+            'etags': data.get('etags') or {},
+        }
+
+    def blob_path(self, digest: str) -> Optional[Path]:
+        """返回内容哈希对应的 blob 路径，不存在时返回 None。"""
+        ext = self.manifest['blobs'].get(digest)
+        if ext is None:
+            return None
+        path = self.blobs_dir / digest[:2] / f"{digest}{ext}"
+        return path if path.exists() else None
+
+    def _link(self, blob: Path, dest: Path):
+        """将 dest 指向 blob：优先硬链接，失败时复制。"""
+        tmp = dest.with_name(f".{dest.name}.{threading.get_ident()}.link")
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest)
+
+    def _record(self, name: str, digest: str, url: Optional[str] = None, etag: Optional[str] = None):
+        self.manifest['files'][name] = digest
+        if url:
+            self.manifest['urls'][url] = digest
+        if etag:
+            self.manifest['etags'][etag] = digest
+        self._dirty += 1
+        if self._dirty >= SAVE_EVERY:
+            self._save_locked()
+
+    def link_known(self, key: str, dest_base: Path, url: Optional[str] = None, by: str = 'urls') -> Optional[str]:
+        """
+        按来源 URL（by='urls'）或 ETag（by='etags'）查找已保存的内容，命中时直接建立链接
+
+        Args:
+            key: URL 或 ETag
+            dest_base: 目标路径（不含扩展名），扩展名沿用 blob 的扩展名
+            url: 记录到清单中的来源 URL
+
+        Returns:
+            已建立链接的文件路径；未命中返回 None
+        """
+        with self._lock:
+            digest = self.manifest[by].get(key) if key else None
+            blob = self.blob_path(digest) if digest else None
+            if blob is None:
+                return None
+            dest = dest_base.with_name(dest_base.name + blob.suffix)
+            self._link(blob, dest)
+            self._record(dest.name, digest, url)
+            self.hits += 1
+            return str(dest)
+
+    def commit(self, tmp: Path, dest: Path, url: Optional[str] = None, etag: Optional[str] = None) -> str:
+        """将下载好的临时文件存入 blob（相同内容只保留一份），并把 dest 链接到该 blob。"""
+        digest = _sha256_file(tmp)
+        with self._lock:
+            blob = self.blob_path(digest)
+            if blob is None:
+                blob = self.blobs_dir / digest[:2] / f"{digest}{dest.suffix}"
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp, blob)
+                self.manifest['blobs'][digest] = dest.suffix
+                self.stored += 1
+            else:
+                tmp.unlink(missing_ok=True)
+                self.hits += 1
+            self._link(blob, dest)
+            self._record(dest.name, digest, url, etag)
+        return str(dest)
+
+    def _save_locked(self):
+        merged = self._read_manifest()
+        for key in ('blobs', 'files', 'urls', 'etags'):
+            merged[key].update(self.manifest[key])
+        self.manifest = merged
+        tmp = self.manifest_file.with_name(f"manifest.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.manifest_file)
+        self._dirty = 0
+
+    def save(self):
+        """合并磁盘上的清单后原子写回。"""
+        with self._lock:
+            self._save_locked()
+
+
+def compact_images(images_dir: str) -> Dict[str, int]:
+    """
+    整理图片目录：把未入库的图片按内容去重并改为硬链接，删除不再被任何图片引用的 blob
+
+    Args:
+        images_dir: 帖子图片目录
+
+    Returns:
+        统计 {'adopted', 'deduplicated', 'removed_blobs', 'freed_bytes'}
+    """
+    store = ImageStore(images_dir)
+    stats = {'adopted': 0, 'deduplicated': 0, 'removed_blobs': 0, 'freed_bytes': 0}
+    manifest = store.manifest
+    for path in sorted(store.images_dir.iterdir()):
+        if not path.is_file() or path.name.startswith('.'):
+            continue
+        digest = manifest['files'].get(path.name)
+        blob = store.blob_path(digest) if digest else None
+        if blob is not None and os.path.samefile(blob, path):
+            continue
+        digest = _sha256_file(path)
+        blob = store.blob_path(digest)
+        if blob is None:
+            # 首次出现的内容：图片文件本身成为 blob
+            blob = store.blobs_dir / digest[:2] / f"{digest}{path.suffix}"
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, blob)
+            except OSError:
+                shutil.copyfile(path, blob)
+            manifest['blobs'][digest] = path.suffix
+            stats['adopted'] += 1
+        elif not os.path.samefile(blob, path):
+            stats['freed_bytes'] += path.stat().st_size
+            store._link(blob, path)
+            stats['deduplicated'] += 1
+        manifest['files'][path.name] = digest
+    # 清理已删除图片的记录与无人引用的 blob
+    manifest['files'] = {name: d for name, d in manifest['files'].items() if (store.images_dir / name).exists()}
+    referenced = set(manifest['files'].values())
+    for digest in list(manifest['blobs']):
+        if digest in referenced:
+            continue
+        blob = store.blob_path(digest)
+        if blob is not None:
+            stats['freed_bytes'] += blob.stat().st_size
+            blob.unlink()
+        del manifest['blobs'][digest]
+        stats['removed_blobs'] += 1
+    manifest['urls'] = {u: d for u, d in manifest['urls'].items() if d in manifest['blobs']}
+    manifest['etags'] = {e: d for e, d in manifest['etags'].items() if d in manifest['blobs']}
+    # 直接覆盖清单（不合并），确保删除的记录不会被恢复
+    tmp = store.manifest_file.with_name(f"manifest.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, store.manifest_file)
+    return stats
@@ -0,0 +1,5 @@
+"""抓取日志模块 - 追加写入的 JSONL 任务日志，记录每个帖子的处理阶段以支持断点续抓"""
+
+from .crawl_journal import STAGES, CrawlJournal
+
+__all__ = ['STAGES', 'CrawlJournal']
@@ -0,0 +1,152 @@
+"""
+抓取任务日志
+每行一条 JSON 记录：
+- {"type": "run", "source": "user"|"csv", "target": ..., "ts": ...}           任务开始
+- {"type": "note", "url": ..., "stage": ..., "ts": ..., ["data"|"images"|"entry": ...]}  帖子阶段变化
+- {"type": "done", "ts": ...}                                                  任务正常结束
+帖子阶段依次为 queued → fetched → images → rendered，失败时为 failed；
+fetched 附带提取到的帖子数据，images 附带已下载的本地图片，rendered 附带索引条目，
+恢复时已提取的帖子不再重新打开详情页，图片齐全的帖子不再重新下载
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+STAGES = ('queued', 'fetched', 'images', 'rendered', 'failed')
+
+
+class CrawlJournal:
+    """追加写入的抓取任务日志
+
+    每条记录写入后立即 flush，进程崩溃时已完成的阶段不会丢失；
+    多个进程可同时向同一文件追加（每条记录一次 write）。
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化日志
+
+        Args:
+            path: 日志文件路径（如 output/.tmp/journal.jsonl）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict):
+        record['ts'] = time.time()
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+
+    def start_run(self, source: str, target):
+        """开始新任务：清空旧日志并写入任务记录。"""
+        with self._lock:
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text('', encoding='utf-8')
+            os.replace(tmp, self.path)
+        self._append({'type': 'run', 'source': source, 'target': target})
+
+    def queued(self, urls: List[str]):
+        """记录待处理的帖子（按处理顺序）。"""
+        for url in urls:
+            self.mark(url, 'queued')
+
+    def mark(self, url: str, stage: str, entry: Optional[Dict] = None, images: Optional[List[str]] = None):
+        """记录帖子进入某个阶段，images 阶段附带本地图片列表，rendered 阶段附带索引条目。"""
+        record = {'type': 'note', 'url': url, 'stage': stage}
+        if images is not None:
+            record['images'] = images
+        if entry is not None:
+            record['entry'] = entry
+        self._append(record)
+
+    def fetched(self, url: str, data: Dict):
+        """记录帖子已提取，附带帖子数据（页面中捕获的图片内容不写入日志）。"""
+        record = {'type': 'note', 'url': url, 'stage': 'fetched'}
+        record['data'] = {key: value for key, value in data.items() if key != 'captured_images'}
+        self._append(record)
+
+    def finish_run(self):
+        """任务正常结束。"""
+        self._append({'type': 'done'})
+
+    def load(self) -> Optional[Dict]:
+        """
+        回放日志
+
+        Returns:
+            {'source', 'target', 'finished', 'links': 按入队顺序的链接, 'stages': {url: 最新阶段},
+             'data': {url: 帖子数据}, 'images': {url: 本地图片列表}, 'entries': {url: 索引条目}}；没有日志时返回 None
+        """
+        if not self.path.exists():
+            return None
+        state = None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能不完整
+                    continue
+                kind = record.get('type')
+                if kind == 'run':
+                    state = {'source': record.get('source'), 'target': record.get('target'), 'finished': False, 'links': [], 'stages': {}, 'data': {}, 'images': {}, 'entries': {}}
+                elif state is None:
+                    continue
+                elif kind == 'done':
+                    state['finished'] = True
+                elif kind == 'note':
+                    url = record.get('url')
+                    stage = record.get('stage')
+                    if url not in state['stages']:
+                        state['links'].append(url)
+                    # 已完成的帖子不会被后续的失败记录覆盖
+                    if state['stages'].get(url) != 'rendered':
+                        state['stages'][url] = stage
+                    if stage == 'fetched' and record.get('data'):
+                        state['data'][url] = record['data']
+                        # 重新提取后此前下载的图片不再可信
+                        state['images'].pop(url, None)
+                    elif stage == 'images' and record.get('images') is not None:
+                        state['images'][url] = record['images']
+                    elif stage == 'rendered' and record.get('entry'):
+                        state['entries'][url] = record['entry']
+        return state
+
+    @staticmethod
+    def fetched_posts(state: Dict) -> List[Dict]:
+        """
+        已提取但尚未保存的帖子，按原顺序
+
+        Returns:
+            帖子数据列表；到达 images 阶段的帖子 downloaded_images 为已下载的本地图片
+        """
+        posts = []
+        for url in state['links']:
+            if state['stages'].get(url) in ('fetched', 'images') and url in state['data']:
+                data = dict(state['data'][url])
+                if state['stages'][url] == 'images' and url in state['images']:
+                    data['downloaded_images'] = state['images'][url]
+                posts.append(data)
+        return posts
+
+    @staticmethod
+    def pending_links(state: Dict) -> List[str]:
+        """需要重新打开详情页的链接（未提取或失败的），按原顺序。"""
+        return [
+            url for url in state['links']
+            if state['stages'].get(url) != 'rendered'
+            and not (state['stages'].get(url) in ('fetched', 'images') and url in state['data'])
+        ]
+
+    @staticmethod
+    def completed_entries(state: Dict) -> List[Dict]:
+        """已完成的索引条目，按原顺序。"""
+        return [state['entries'][url] for url in state['links'] if url in state['entries']]
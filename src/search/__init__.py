@@ -0,0 +1,6 @@
+"""检索模块 - 中文二元组分词与磁盘倒排索引，供静态索引页的离线检索与 --search 全文检索使用"""
+
+from .inverted_index import SEARCH_INDEX_FILENAME, SearchIndex
+from .tokenizer import tokenize
+
+__all__ = ['SEARCH_INDEX_FILENAME', 'SearchIndex', 'tokenize']
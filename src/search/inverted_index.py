@@ -0,0 +1,231 @@
+"""
+磁盘倒排索引
+输出目录中的 search.db（SQLite）保存每个帖子文件的检索词频（tokenize 切分的二元组、单字与词），
+保存帖子时增量写入；检索时只读取查询词对应的倒排记录（字母数字按前缀匹配），
+在 SQLite 中计算 BM25 得分并排序截取前若干条，再读取这些文档截取正文摘要
+"""
+
+import math
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .tokenizer import tokenize
+
+SEARCH_INDEX_FILENAME = 'search.db'
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_BEFORE = 30
+SNIPPET_AFTER = 70
+# 索引结构版本，变化后打开时清空旧索引，由调用方重新补建
+INDEX_VERSION = 3
+# SQLite 页缓存大小（KB）
+CACHE_SIZE_KB = 65536
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    title TEXT,
+    text TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def make_snippet(text: str, query: str, terms: List[str]) -> str:
+    """截取正文中首个命中位置附近的片段（优先整句查询，其次任一检索词）。"""
+    lowered = text.lower()
+    pos = lowered.find(query.lower()) if query else -1
+    if pos < 0:
+        hits = [p for p in (lowered.find(term) for term in terms) if p >= 0]
+        pos = min(hits) if hits else 0
+    start = max(0, pos - SNIPPET_BEFORE)
+    end = min(len(text), pos + SNIPPET_AFTER)
+    return f"{'…' if start > 0 else ''}{text[start:end]}{'…' if end < len(text) else ''}"
+
+
+class SearchIndex:
+    """帖子全文检索索引
+
+    线程安全；多个进程可同时写入同一数据库，写入冲突时 SQLite 自动等待。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        打开（必要时创建）索引数据库
+
+        Args:
+            db_path: 数据库文件路径（如 output/search.db）
+        """
+        self.path = Path(db_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            # 倒排表按检索词聚簇，补建索引时的随机插入需要较大的页缓存
+            self._conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+            self._conn.executescript(SCHEMA)
+            row = self._conn.execute("SELECT value FROM stats WHERE key = 'index_version'").fetchone()
+            if (row[0] if row else 0) != INDEX_VERSION:
+                self._conn.executescript("DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS docs; DROP TABLE IF EXISTS stats;")
+                self._conn.executescript(SCHEMA)
+                self._conn.execute("INSERT INTO stats (key, value) VALUES ('index_version', ?)", (INDEX_VERSION,))
+            self._conn.commit()
+
+    def _bump(self, docs: int, length: int):
+        for key, delta in (('docs', docs), ('length', length)):
+            self._conn.execute(
+                "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, delta),
+            )
+
+    def _remove(self, path: str):
+        row = self._conn.execute("SELECT id, length FROM docs WHERE path = ?", (path,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM postings WHERE doc = ?", (row[0],))
+            self._conn.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+            self._bump(-1, -row[1])
+
+    def _insert(self, path: str, title: Optional[str], text: str):
+        terms = tokenize(f"{title or ''}\n{text}", unigrams=True)
+        self._remove(path)
+        cur = self._conn.execute(
+            "INSERT INTO docs (path, title, text, length) VALUES (?, ?, ?, ?)",
+            (path, title, text, len(terms)),
+        )
+        doc = cur.lastrowid
+        # 倒排记录中冗余保存文档长度，检索时无需回表即可计算 BM25
+        self._conn.executemany(
+            "INSERT INTO postings (term, doc, tf, length) VALUES (?, ?, ?, ?)",
+            ((term, doc, tf, len(terms)) for term, tf in Counter(terms).items()),
+        )
+        self._bump(1, len(terms))
+
+    def add(self, path: str, title: Optional[str], text: str):
+        """
+        写入（或替换）一个文档的倒排记录
+
+        Args:
+            path: 文档相对输出目录的文件名
+            title: 标题
+            text: 正文纯文本（标题与正文都参与检索）
+        """
+        self.add_many([(path, title, text)])
+
+    def add_many(self, docs: Iterable[Tuple[str, Optional[str], str]]):
+        """批量写入（或替换）文档 (path, title, text)，在一个事务中提交，用于补建索引。"""
+        with self._lock:
+            try:
+                for path, title, text in docs:
+                    self._insert(path, title, text)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def remove(self, path: str):
+        """删除一个文档的倒排记录。"""
+        with self._lock:
+            self._remove(path)
+            self._conn.commit()
+
+    def paths(self) -> set:
+        """已建立索引的文档文件名。"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT path FROM docs")}
+
+    def get_stat(self, key: str) -> int:
+        """读取统计/版本计数，不存在时为 0。"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def set_stat(self, key: str, value: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def count(self) -> int:
+        """已建立索引的文档数。"""
+        return self.get_stat('docs')
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        检索文档
+
+        命中查询词越多的文档越靠前，命中数相同时按 BM25 得分排序。
+        中日韩文字按二元组（单字查询按单字）精确匹配，字母数字按前缀匹配（如 topi 命中 topic）。
+
+        Args:
+            query: 查询文本（切分方式与建立索引时相同）
+            limit: 最多返回的结果数
+
+        Returns:
+            [{'path', 'title', 'score', 'matched', 'snippet'}]，按相关度降序
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT key, value FROM stats").fetchall())
+            total_docs = stats.get('docs', 0)
+            if not total_docs:
+                return []
+            avg_length = stats.get('length', 0) / total_docs or 1
+            # 每个检索词一条子查询：(文档, 词频, 文档长度)，字母数字按前缀聚合到文档
+            parts: List[str] = []
+            params: List = []
+            for term in terms:
+                if term.isascii():
+                    bounds = (term, term[:-1] + chr(ord(term[-1]) + 1))
+                    df = self._conn.execute("SELECT COUNT(DISTINCT doc) FROM postings WHERE term >= ? AND term < ?", bounds).fetchone()[0]
+                    source = "SELECT doc, SUM(tf) AS tf, MAX(length) AS length FROM postings WHERE term >= ? AND term < ? GROUP BY doc"
+                else:
+                    bounds = (term,)
+                    df = self._conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", bounds).fetchone()[0]
+                    source = "SELECT doc, tf, length FROM postings WHERE term = ?"
+                if not df:
+                    continue
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                parts.append(f"SELECT doc, ? * tf / (tf + ? + ? * length) AS score FROM ({source})")
+                params += [idf * (BM25_K1 + 1), BM25_K1 * (1 - BM25_B), BM25_K1 * BM25_B / avg_length, *bounds]
+            if not parts:
+                return []
+            ranked = self._conn.execute(
+                f"SELECT doc, COUNT(*) AS matched, SUM(score) AS score FROM ({' UNION ALL '.join(parts)}) "
+                "GROUP BY doc ORDER BY matched DESC, score DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+            results = []
+            for doc, matched, score in ranked:
+                path, title, text = self._conn.execute("SELECT path, title, text FROM docs WHERE id = ?", (doc,)).fetchone()
+                results.append({
+                    'path': path,
+                    'title': title,
+                    'score': score,
+                    'matched': matched,
+                    'snippet': make_snippet(text, query.strip(), terms),
+                })
+        return results
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
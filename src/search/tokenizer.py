@@ -0,0 +1,35 @@
+"""
+中文友好的分词
+连续的中日韩文字切分为相邻二元组（单字片段保留单字，建立索引时可同时保留每个单字），字母与数字按词切分并转为小写，
+无需词典即可对中文标题与正文建立倒排索引
+"""
+
+import re
+from typing import List
+
+TOKEN_RE = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+)|([0-9a-z]+)')
+
+
+def tokenize(text: str, unigrams: bool = False) -> List[str]:
+    """
+    将文本切分为检索词（保留重复与出现顺序）
+
+    Args:
+        text: 任意文本
+        unigrams: 是否同时输出连续中日韩文字中的每个单字（建立索引时使用，单字查询可直接命中）
+
+    Returns:
+        检索词列表，如 "雅思词汇 IELTS" -> ['雅思', '思词', '词汇', 'ielts']
+    """
+    terms: List[str] = []
+    for match in TOKEN_RE.finditer((text or '').lower()):
+        run = match.group(1)
+        if run is None:
+            terms.append(match.group(2))
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if unigrams:
+                terms.extend(run)
+    return terms